@@ -1,160 +1,114 @@
 # @title The Definitive Master Engine and its Components (v7.0 - Compliant)
 import fitz  # PyMuPDF
-from sklearn.cluster import DBSCAN
-from sklearn.preprocessing import StandardScaler
 import numpy as np
-import pandas as pd
 import time
 import re
+import math
 import json
 import os
-from collections import Counter
+import hashlib
+import itertools
+import shutil
+import argparse
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+import resource
+import multiprocessing
+from multiprocessing.connection import wait
+import sys
+from collections import deque
+from functools import lru_cache
+
+# In the container the shared modules sit next to this file; in the repository they live in ../common.
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'common'))
+import pdf_extraction
+from engine_support import JSONRequestHandler, record_stage, run_server
+from pdf_extraction import (SHARD_MIN_PAGES, extract_page_layouts, extract_page_layouts_sharded, get_all_blocks,
+                            identify_repeating_elements, run_hybrid_engine, select_blocks, text_mask, word_counts)
 
 # ==============================================================================
 # FINALIZED HELPER FUNCTIONS
 # ==============================================================================
 
-def _get_document_baseline(doc):
-    """Calculates the most common font size for the document's body text."""
-    if not doc or doc.is_closed or doc.page_count == 0: return 10
-    sizes = Counter()
-    for page in doc:
-        for block in page.get_text("dict").get("blocks", []):
-            if "lines" in block:
-                for line in block.get("lines", []):
-                    for span in line.get("spans", []):
-                        sizes[round(span["size"])] += len(span["text"])
-    return sizes.most_common(1)[0][0] if sizes else 10
-
-def _identify_repeating_elements(doc):
-    """Identifies headers/footers by finding text that repeats across pages."""
-    if not doc or doc.is_closed or len(doc) < 3:
-        return set(), set()
-    repeating_texts = Counter()
-    for page in doc:
-        top_rect = fitz.Rect(0, 0, page.rect.width, page.rect.height * 0.1)
-        bottom_rect = fitz.Rect(0, page.rect.height * 0.9, page.rect.width, page.rect.height)
-        for rect, key in [(top_rect, "header"), (bottom_rect, "footer")]:
-            text = page.get_text(clip=rect, sort=True).strip()
-            if text and len(text.split()) < 15 and not text.isdigit():
-                repeating_texts[(text, key)] += 1
-    min_occurrence = max(2, len(doc) // 3)
-    headers = {text for (text, key), count in repeating_texts.items() if key == 'header' and count >= min_occurrence}
-    footers = {text for (text, key), count in repeating_texts.items() if key == 'footer' and count >= min_occurrence}
-    return headers, footers
-
-def _is_toc_page(page):
-    """Heuristic to detect if a page is a Table of Contents."""
-    blocks = page.get_text("blocks")
-    if not blocks: return False
-    toc_keywords = ["table of contents", "contents"]
-    for b in blocks[:5]:
-        if any(keyword in b[4].lower() for keyword in toc_keywords):
-            return True
-    dot_leader_count = sum(1 for b in blocks if "..." in b[4] and b[4].strip().endswith(tuple(map(str, range(10)))))
-    if len(blocks) > 5 and dot_leader_count / len(blocks) > 0.3:
-        return True
-    return False
-
-def _get_all_blocks(doc, headers, footers):
-    """A standardized function to extract all text blocks with metadata."""
-    all_blocks = []
-    full_filter_list = headers.union(footers)
-    for page_num, page in enumerate(doc):
-        if _is_toc_page(page):
-            continue
-        for block in page.get_text("dict").get("blocks", []):
-            block_text = " ".join(s["text"].strip() for l in block.get("lines", []) for s in l.get("spans", [])).strip()
-            if not block_text or block_text.isdigit() or block_text in full_filter_list:
-                continue
-            if "lines" in block and block["lines"] and "spans" in block["lines"][0] and block["lines"][0]["spans"]:
-                first_span = block["lines"][0]["spans"][0]
-                all_blocks.append({
-                    "text": block_text, "page": page_num + 1, "size": first_span["size"],
-                    "bold": "bold" in first_span["font"].lower() or "black" in first_span["font"].lower(),
-                    "y0": block['bbox'][1], "x0": block['bbox'][0]
-                })
-    return all_blocks
-
 def _classify_document_type(doc, all_blocks):
     """Classifies the document to route it to the best engine."""
-    if not all_blocks: return "flyer"
-    text_content = " ".join(b['text'] for b in all_blocks)
-    if len(doc) == 1 and np.mean([len(b['text'].split()) for b in all_blocks]) < 8:
+    texts = all_blocks["text"]
+    if not len(texts): return "flyer"
+    if len(doc) == 1 and word_counts(texts).mean() < 8:
         return "form"
     if len(doc) == 1:
-        font_sizes = [b['size'] for b in all_blocks]
+        font_sizes = all_blocks["size"]
         if len(font_sizes) > 1 and np.std(font_sizes) > 4:
             return "flyer"
-    hierarchical_headings = sum(1 for b in all_blocks if re.match(r"^\s*\d+(\.\d+)+", b['text']))
+    hierarchical_headings = int(text_mask(texts, HIERARCHICAL_PATTERN).sum())
     if hierarchical_headings > len(doc) * 0.4:
         return "technical"
-    if "request for proposal" in text_content.lower() or "rfp" in text_content.lower():
-        return "business_rfp"
     return "business_rfp"
 
 # ==============================================================================
 # SPECIALIZED ENGINES
 # ==============================================================================
 
-def _run_visual_engine(doc, all_blocks, filter_list):
-    """Specialist for technical documents with consistent styling."""
-    df = pd.DataFrame(all_blocks)
-    df = df[~df['text'].isin(filter_list)]
-    if df.empty: return []
-    features = StandardScaler().fit_transform(df[['size', 'bold', 'x0']])
-    db = DBSCAN(eps=0.5, min_samples=3).fit(features)
-    df['cluster'] = db.labels_
-    if -1 not in df['cluster'].unique(): return []
-    cluster_stats = df[df.cluster != -1].groupby('cluster').agg(count=('size', 'count')).reset_index()
-    if cluster_stats.empty: return []
-    body_cluster = cluster_stats.loc[cluster_stats['count'].idxmax()]['cluster']
-    headings_df = df[(df['cluster'] != -1) & (df['cluster'] != body_cluster)].copy()
-    noise_patterns = [r"^\s*\d+\s*$", r"©", r"table\s\d+", r"figure\s\d+", r"international software testing"]
-    for pattern in noise_patterns:
-        headings_df = headings_df[~headings_df['text'].str.contains(pattern, case=False, regex=True)]
-    if headings_df.empty: return []
-    avg_size = headings_df.groupby('cluster')['size'].mean().sort_values(ascending=False)
-    level_map = {cid: f"H{min(i + 1, 4)}" for i, cid in enumerate(avg_size.index)}
-    headings_df['level'] = headings_df['cluster'].map(level_map)
-    final_outline = headings_df.sort_values(by=['page', 'y0'])[['level', 'text', 'page']].to_dict('records')
-    return [h for h in final_outline if len(h['text'].split()) < 30]
-
-def _run_hybrid_engine(doc, all_blocks):
-    """A highly adaptive engine for business docs, forms, and flyers."""
-    baseline_size = _get_document_baseline(doc)
-    outline = []
-    numbered_pattern = re.compile(r"^\s*(?:(Appendix\s[A-Z])|(\d+(?:\.\d+)*)|([A-Z]))\s*[.:-]?\s*")
+HIERARCHICAL_PATTERN = re.compile(r"^\s*\d+(\.\d+)+")
+NOISE_PATTERN = re.compile("|".join([r"^\s*\d+\s*$", r"©", r"table\s\d+", r"figure\s\d+", r"international software testing"]),
+                           re.IGNORECASE)
 
-    for i, block in enumerate(all_blocks):
-        text, is_bold, size = block['text'], block['bold'], block['size']
-        level, clean_text = None, text
+def _style_histogram(features):
+    """
+    Collapses identical feature rows into distinct styles, ordered by first
+    occurrence so DBSCAN numbers the clusters as it would over the blocks.
+    Returns the styles, their block counts and each block's style index.
+    """
+    styles, first, inverse, counts = np.unique(features, axis=0, return_index=True,
+                                               return_inverse=True, return_counts=True)
+    order = np.argsort(first)
+    position = np.empty_like(order)
+    position[order] = np.arange(len(order))
+    return styles[order], counts[order], position[inverse.reshape(-1)]
 
-        match = numbered_pattern.match(text)
-        
-        if match:
-            if not is_bold and (len(text.split()) < 5 and size < baseline_size * 1.1):
-                continue
-            
-            groups, clean_text = match.groups(), text[match.end():].strip()
-            num_str = next(g for g in groups if g is not None)
-            level = "H1" if "Appendix" in num_str else f"H{min(num_str.count('.') + 1, 4)}"
-            
-        elif is_bold and size > baseline_size * 1.15:
-            if len(text.split()) < 5 and (i + 1 >= len(all_blocks) or len(all_blocks[i+1]['text'].split()) < 15):
-                continue
-            level = "H2" if size > baseline_size * 1.4 else "H3"
-        
-        if clean_text and level:
-            outline.append({"level": level, "text": clean_text, "page": block["page"], "y0": block["y0"]})
-    
-    final_outline = []
-    seen = set()
-    for h in sorted(outline, key=lambda x: (x['page'], x['y0'])):
-        if (h['text'], h['level']) not in seen:
-            final_outline.append({'level': h['level'], 'text': h['text'], 'page': h['page']})
-            seen.add((h['text'], h['level']))
-    return final_outline
+def _sklearn_clustering():
+    """
+    DBSCAN and StandardScaler for the visual engine. scikit-learn takes longer
+    to import than most PDFs take to process, so the one-shot CLI imports it
+    only for technical documents; the batch and service modes call this before
+    forking so every worker inherits the import.
+    """
+    from sklearn.cluster import DBSCAN
+    from sklearn.preprocessing import StandardScaler
+    return DBSCAN, StandardScaler
+
+def _run_visual_engine(doc, all_blocks, filter_list):
+    """Specialist for technical documents with consistent styling."""
+    DBSCAN, StandardScaler = _sklearn_clustering()
+    blocks = select_blocks(all_blocks, ~np.isin(all_blocks["text"], list(filter_list)))
+    if not len(blocks["text"]): return []
+    features = np.column_stack([blocks["size"], blocks["bold"], blocks["x0"]])
+    scaler = StandardScaler().fit(features)
+    # Blocks share a handful of styles: cluster each distinct style once, weighted by its block count.
+    styles, counts, style_of_block = _style_histogram(features)
+    style_labels = DBSCAN(eps=0.5, min_samples=3).fit(scaler.transform(styles), sample_weight=counts).labels_
+    labels = style_labels[style_of_block]
+    if not (labels == -1).any(): return []
+    cluster_ids, counts = np.unique(labels[labels != -1], return_counts=True)
+    if not len(cluster_ids): return []
+    body_cluster = cluster_ids[np.argmax(counts)]
+    heading_mask = (labels != -1) & (labels != body_cluster)
+    heading_mask[heading_mask] = ~text_mask(blocks["text"][heading_mask], NOISE_PATTERN)
+    if not heading_mask.any(): return []
+    headings = select_blocks(blocks, heading_mask)
+    heading_labels = labels[heading_mask]
+    heading_clusters, inverse = np.unique(heading_labels, return_inverse=True)
+    # fsum keeps the mean of identical sizes exact, so equally sized clusters tie and keep cluster order.
+    avg_size = np.array([math.fsum(headings["size"][inverse == k]) for k in range(len(heading_clusters))])
+    avg_size /= np.bincount(inverse)
+    rank = np.empty(len(heading_clusters), dtype=np.int64)
+    # Same descending argsort pandas' sort_values(ascending=False) performs, so tied sizes rank as before.
+    rank[np.arange(len(avg_size))[::-1][avg_size[::-1].argsort()][::-1]] = np.arange(len(heading_clusters))
+    levels = np.minimum(rank[inverse] + 1, 4)
+    order = np.lexsort((headings["y0"], headings["page"]))
+    heading_word_counts = word_counts(headings["text"])
+    return [{"level": f"H{levels[i]}", "text": headings["text"][i], "page": int(headings["page"][i])}
+            for i in order if heading_word_counts[i] < 30]
 
 def _extract_from_bookmarks(doc):
     """Extracts headings from PDF bookmarks."""
@@ -165,71 +119,400 @@ def _extract_from_bookmarks(doc):
 # THE MASTER ENGINE
 # ==============================================================================
 
-def run_master_engine(pdf_path: str):
-    """The definitive, production-ready heading extraction solution."""
+def run_master_engine(pdf_path: str, metrics=None, shards=1):
+    """
+    The definitive, production-ready heading extraction solution.
+    Pass a dict as `metrics` to collect per-stage timings and counters. With
+    `shards` > 1, pages of large documents are parsed by that many processes.
+    """
+    start = time.perf_counter()
     try:
         doc = fitz.open(pdf_path)
     except Exception as e:
         return {"title": f"Error processing {os.path.basename(pdf_path)}", "outline": []}
+    start = record_stage(metrics, "open", start, pages=doc.page_count)
 
     bookmark_outline = _extract_from_bookmarks(doc)
+    start = record_stage(metrics, "bookmarks", start, entries=len(bookmark_outline or []))
     if bookmark_outline:
+        if metrics is not None:
+            metrics["engine"] = "bookmarks"
         title = bookmark_outline[0]['text'] if bookmark_outline else "Untitled"
         return {"title": title, "outline": bookmark_outline[1:]}
 
-    headers, footers = _identify_repeating_elements(doc)
-    all_blocks = _get_all_blocks(doc, headers, footers)
+    # Daemonic processes (the batch-mode workers) cannot start a pool of their own.
+    shards = min(shards, doc.page_count // SHARD_MIN_PAGES)
+    if shards > 1 and not multiprocessing.current_process().daemon:
+        layout = extract_page_layouts_sharded(doc, pdf_path, shards)
+    else:
+        shards = 1
+        layout = extract_page_layouts(doc)
+    start = record_stage(metrics, "extract_page_layouts", start, pages=layout["page_count"], shards=shards)
+    headers, footers = identify_repeating_elements(layout)
+    start = record_stage(metrics, "identify_repeating_elements", start, headers=len(headers), footers=len(footers))
+    all_blocks = get_all_blocks(layout, headers, footers)
+    start = record_stage(metrics, "get_all_blocks", start, blocks=len(all_blocks["text"]))
 
-    if not all_blocks:
+    if not len(all_blocks["text"]):
         return {"title": "No text content found", "outline": []}
 
-    first_page_top_blocks = [b for b in all_blocks if b['page'] == 1 and b['y0'] < doc[0].rect.height * 0.3]
-    title = sorted(first_page_top_blocks, key=lambda x: -x['size'])[0]['text'] if first_page_top_blocks else "Untitled"
+    first_page_top = np.flatnonzero((all_blocks["page"] == 1) & (all_blocks["y0"] < layout['first_page_height'] * 0.3))
+    title = all_blocks["text"][first_page_top[np.argmax(all_blocks["size"][first_page_top])]] if len(first_page_top) else "Untitled"
 
     doc_type = _classify_document_type(doc, all_blocks)
+    start = record_stage(metrics, "classify_document_type", start)
     
     outline = []
     if doc_type == 'technical':
+        engine = "visual"
         outline = _run_visual_engine(doc, all_blocks, headers.union(footers))
     else:
-        outline = _run_hybrid_engine(doc, all_blocks)
+        engine = "hybrid"
+        outline = run_hybrid_engine(layout, all_blocks)
+    record_stage(metrics, f"{engine}_engine", start, headings=len(outline))
+    if metrics is not None:
+        metrics.update(doc_type=doc_type, engine=engine)
     
     return {
         "title": title,
         "outline": outline,
     }
 
+# ==============================================================================
+# CONTENT-ADDRESSED RESULT CACHE
+# ==============================================================================
+
+# Bump when the heuristics change in a way the source fingerprint cannot see
+# (e.g. a PyMuPDF upgrade that alters text extraction).
+ENGINE_VERSION = "7.0"
+
+@lru_cache(maxsize=None)
+def _engine_fingerprint():
+    """Identifies the engine build: ENGINE_VERSION plus a hash of this module's and pdf_extraction's source."""
+    source_hash = hashlib.sha256()
+    for path in (__file__, pdf_extraction.__file__):
+        with open(os.path.abspath(path), 'rb') as f:
+            source_hash.update(f.read())
+    return hashlib.sha256(f"{ENGINE_VERSION}:{fitz.VersionBind}:{source_hash.hexdigest()}".encode()).hexdigest()[:16]
+
+def _cache_key(pdf_path):
+    """Hashes the PDF's bytes together with the engine fingerprint."""
+    digest = hashlib.sha256(_engine_fingerprint().encode())
+    with open(pdf_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def _cache_path(cache_dir, key):
+    return os.path.join(cache_dir, key[:2], key + '.json')
+
+def _cache_lookup(cache_dir, key):
+    """Returns the cached outline for `key`, marking it as recently used, or None."""
+    path = _cache_path(cache_dir, key)
+    try:
+        with open(path) as f:
+            result = json.load(f)
+    except (OSError, ValueError):
+        return None
+    try:
+        os.utime(path)
+    except OSError:
+        pass  # evicted since it was read; the outline is still good
+    return result
+
+def _cache_store(cache_dir, key, result):
+    """Writes a cache entry atomically so concurrent workers never read partial JSON."""
+    path = _cache_path(cache_dir, key)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(result, f)
+    os.replace(tmp_path, path)
+
+def evict_cache(cache_dir, max_mb):
+    """Deletes least-recently-used entries until the cache fits in `max_mb`."""
+    entries = []
+    for root, _, files in os.walk(cache_dir):
+        for name in files:
+            path = os.path.join(root, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+    total = sum(size for _, size, _ in entries)
+    limit = max_mb * 1024 * 1024
+    for _, size, path in sorted(entries):
+        if total <= limit:
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        total -= size
+
+def clear_cache(cache_dir):
+    """Invalidates every cached result."""
+    shutil.rmtree(cache_dir, ignore_errors=True)
+
+def is_error_result(result):
+    """True for the placeholder run_master_engine returns when a PDF cannot be opened."""
+    return result["title"].startswith("Error processing") and not result["outline"]
+
+def run_master_engine_cached(pdf_path, cache_dir=None, metrics=None, shards=1):
+    """Runs the master engine, reusing a stored outline if this exact PDF was seen before."""
+    if not cache_dir:
+        return run_master_engine(pdf_path, metrics, shards)
+    start = time.perf_counter()
+    try:
+        key = _cache_key(pdf_path)
+    except OSError:
+        return run_master_engine(pdf_path, metrics, shards)
+    result = _cache_lookup(cache_dir, key)
+    record_stage(metrics, "cache_lookup", start, hit=result is not None)
+    if result is None:
+        result = run_master_engine(pdf_path, metrics, shards)
+        if not is_error_result(result):
+            _cache_store(cache_dir, key, result)
+    elif metrics is not None:
+        metrics["engine"] = "cache"
+    return result
+
+# ==============================================================================
+# PARALLEL BATCH MODE
+# ==============================================================================
+
+def _write_result(result, output_path):
+    with open(output_path, 'w') as f:
+        json.dump(result, f, indent=2)
+
+def process_file(pdf_path, output_path, cache_dir=None, metrics_mode=None, shards=1):
+    """
+    Extracts one PDF's outline and writes it to `output_path`. Returns
+    `(error, metrics)`: `error` is None on success or says why the PDF could
+    not be processed. With a `metrics_mode` of "sidecar" or "output",
+    `metrics` is the file's metrics record; "output" also embeds it in the
+    JSON under `_metrics`.
+    """
+    metrics = {"file": os.path.basename(pdf_path)} if metrics_mode else None
+    start = time.perf_counter()
+    result = run_master_engine_cached(pdf_path, cache_dir, metrics, shards)
+    if metrics is not None:
+        metrics["total_seconds"] = round(time.perf_counter() - start, 6)
+        if metrics_mode == "output":
+            result = dict(result, _metrics=metrics)
+    _write_result(result, output_path)
+    error = "could not open the PDF" if is_error_result(result) else None
+    return error, metrics
+
+def _append_metrics(metrics_path, metrics):
+    with open(metrics_path, 'a') as f:
+        f.write(json.dumps(metrics) + "\n")
+
+def _batch_worker(pdf_path, output_path, max_memory_mb, cache_dir, metrics_mode, conn):
+    """Runs the engine for one file inside a worker process with a memory cap."""
+    if max_memory_mb:
+        limit = int(max_memory_mb) * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    try:
+        conn.send(process_file(pdf_path, output_path, cache_dir, metrics_mode))
+    except BaseException as e:
+        conn.send((f"{type(e).__name__}: {e}", None))
+    finally:
+        conn.close()
+
+def run_batch(pdf_files, input_dir, output_dir, workers, timeout=None, max_memory_mb=None, cache_dir=None,
+              metrics_mode=None, metrics_path=None):
+    """
+    Processes PDFs across a pool of worker processes, one process per file.
+    A file that exceeds `timeout` seconds is killed; `max_memory_mb` caps the
+    address space of each worker. Returns a list of failures sorted by filename.
+    """
+    _sklearn_clustering()  # one process per file: import once here, not in every worker
+    pending = deque(sorted(pdf_files))
+    running = {}
+    failures = []
+    while pending or running:
+        while pending and len(running) < workers:
+            filename = pending.popleft()
+            output_path = os.path.join(output_dir, os.path.splitext(filename)[0] + '.json')
+            recv_conn, send_conn = multiprocessing.Pipe(duplex=False)
+            proc = multiprocessing.Process(
+                target=_batch_worker,
+                args=(os.path.join(input_dir, filename), output_path, max_memory_mb, cache_dir, metrics_mode, send_conn),
+                daemon=True)
+            proc.start()
+            send_conn.close()
+            running[proc.sentinel] = (proc, filename, output_path, recv_conn, time.monotonic())
+
+        wait_for = None
+        if timeout:
+            oldest = min(started for *_, started in running.values())
+            wait_for = max(0.0, oldest + timeout - time.monotonic())
+        ready = set(wait(list(running), timeout=wait_for))
+
+        for sentinel, (proc, filename, output_path, recv_conn, started) in list(running.items()):
+            if sentinel in ready:
+                proc.join()
+                error, metrics = recv_conn.recv() if recv_conn.poll() else (f"worker exited with code {proc.exitcode}", None)
+            elif timeout and time.monotonic() - started >= timeout:
+                proc.kill()
+                proc.join()
+                error, metrics = f"timed out after {timeout}s", None
+            else:
+                continue
+            recv_conn.close()
+            del running[sentinel]
+            if error:
+                if os.path.exists(output_path):
+                    os.remove(output_path)
+                failures.append({"file": filename, "error": error})
+                print(f"Failed {filename}: {error}")
+            else:
+                print(f"Successfully processed {filename}")
+            if metrics and metrics_path:
+                _append_metrics(metrics_path, metrics)
+    return sorted(failures, key=lambda f: f["file"])
+
+# ==============================================================================
+# WARM SERVICE MODE
+# ==============================================================================
+# A long-lived daemon that keeps PyMuPDF, NumPy and scikit-learn imported and a
+# pool of warm worker processes forked, so a request pays only for the PDF
+# itself. Concurrent requests queue on the pool and run in parallel.
+#
+#   POST /outline  {"pdf_path": "/app/input/doc.pdf"}  or a raw application/pdf body
+#   GET  /health
+
+def _outline_from_bytes(data, cache_dir, shards=1):
+    with tempfile.NamedTemporaryFile(suffix='.pdf') as f:
+        f.write(data)
+        f.flush()
+        return run_master_engine_cached(f.name, cache_dir, shards=shards)
+
+# The service trims the result cache to --cache-max-mb after this many outlines.
+CACHE_EVICT_EVERY = 64
+
+def _make_service_handler(pool, cache_dir, shards=1, cache_max_mb=512):
+    served = itertools.count(1)
+
+    class OutlineHandler(JSONRequestHandler):
+        def do_GET(self):
+            if self.path == '/health':
+                self._reply(200, {"status": "ok"})
+            else:
+                self._reply(404, {"error": f"unknown endpoint {self.path}"})
+
+        def do_POST(self):
+            if self.path != '/outline':
+                self._reply(404, {"error": f"unknown endpoint {self.path}"})
+                return
+            body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+            try:
+                if self.headers.get('Content-Type', '').startswith('application/pdf'):
+                    future = pool.submit(_outline_from_bytes, body, cache_dir, shards)
+                else:
+                    future = pool.submit(run_master_engine_cached, json.loads(body)["pdf_path"], cache_dir,
+                                         shards=shards)
+                self._reply(200, future.result())
+                if cache_dir and next(served) % CACHE_EVICT_EVERY == 0:
+                    evict_cache(cache_dir, cache_max_mb)
+            except (ValueError, KeyError) as e:
+                self._reply(400, {"error": f"expected {{\"pdf_path\": ...}} or a PDF body: {e}"})
+            except Exception as e:
+                self._reply(500, {"error": f"{type(e).__name__}: {e}"})
+
+    return OutlineHandler
+
+def serve(host='127.0.0.1', port=8080, socket_path=None, workers=1, cache_dir=None, shards=1, cache_max_mb=512):
+    """Runs the outline service on a localhost port or, with `socket_path`, a Unix socket."""
+    _sklearn_clustering()
+    if cache_dir:
+        evict_cache(cache_dir, cache_max_mb)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pool.submit(int).result()  # fork the warm workers before the first request arrives
+        handler = _make_service_handler(pool, cache_dir, shards, cache_max_mb)
+        run_server(handler, host, port, socket_path, "Outline service")
+
 # ==============================================================================
 # COMMAND-LINE INTERFACE FOR DOCKER EXECUTION
 # ==============================================================================
 def main():
     """
     Main function to automatically process all PDFs in the /app/input directory
-    and save the JSON output to the /app/output directory.
+    and save the JSON output to the /app/output directory. With --workers > 1
+    the files are processed by a pool of worker processes.
     """
-    input_dir = '/app/input'
-    output_dir = '/app/output'
+    parser = argparse.ArgumentParser(description="Extract PDF outlines to JSON.")
+    parser.add_argument('--input-dir', default='/app/input')
+    parser.add_argument('--output-dir', default='/app/output')
+    parser.add_argument('--workers', type=int, default=1,
+                        help="number of worker processes (1 processes files in this process)")
+    parser.add_argument('--timeout', type=float, default=None,
+                        help="per-file timeout in seconds (batch mode only)")
+    parser.add_argument('--max-memory-mb', type=int, default=None,
+                        help="per-worker address-space cap in MB (batch mode only)")
+    parser.add_argument('--cache-dir', default=None,
+                        help="reuse outlines of unchanged PDFs stored in this directory")
+    parser.add_argument('--cache-max-mb', type=int, default=512,
+                        help="size limit of the result cache; least recently used entries are evicted")
+    parser.add_argument('--clear-cache', action='store_true',
+                        help="drop all cached outlines before processing")
+    parser.add_argument('--metrics', default=None, metavar='PATH',
+                        help="append per-file stage timings and counters to this JSONL file")
+    parser.add_argument('--metrics-in-output', action='store_true',
+                        help="embed the per-file metrics in each output JSON under `_metrics`")
+    parser.add_argument('--serve', action='store_true',
+                        help="run as a warm outline service instead of processing --input-dir")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--socket', default=None, help="serve on this Unix socket instead of a TCP port")
+    parser.add_argument('--shards', type=int, default=1,
+                        help="parse the pages of each large PDF in this many processes (not with --workers > 1)")
+    args = parser.parse_args()
+    input_dir, output_dir = args.input_dir, args.output_dir
+
+    if args.serve:
+        serve(args.host, args.port, args.socket, workers=args.workers, cache_dir=args.cache_dir, shards=args.shards,
+              cache_max_mb=args.cache_max_mb)
+        return
 
     if not os.path.exists(input_dir):
         print(f"Error: Input directory does not exist: {input_dir}")
         return
 
     os.makedirs(output_dir, exist_ok=True)
+    pdf_files = sorted(f for f in os.listdir(input_dir) if f.lower().endswith('.pdf'))
+    cache_dir = args.cache_dir
+    if cache_dir and args.clear_cache:
+        clear_cache(cache_dir)
+    metrics_mode = "output" if args.metrics_in_output else "sidecar" if args.metrics else None
 
-    for filename in os.listdir(input_dir):
-        if filename.lower().endswith('.pdf'):
+    if args.workers > 1:
+        failures = run_batch(pdf_files, input_dir, output_dir, args.workers,
+                             timeout=args.timeout, max_memory_mb=args.max_memory_mb, cache_dir=cache_dir,
+                             metrics_mode=metrics_mode, metrics_path=args.metrics)
+        summary_path = os.path.join(output_dir, 'batch_summary.json')
+        _write_result({"processed": len(pdf_files), "failed": len(failures), "failures": failures}, summary_path)
+        print(f"Processed {len(pdf_files)} files, {len(failures)} failed. Summary written to {summary_path}")
+    else:
+        for filename in pdf_files:
             pdf_path = os.path.join(input_dir, filename)
             print(f"Processing {pdf_path}...")
-            
-            result = run_master_engine(pdf_path)
-            
+
             output_filename = os.path.splitext(filename)[0] + '.json'
             output_path = os.path.join(output_dir, output_filename)
-            
-            with open(output_path, 'w') as f:
-                json.dump(result, f, indent=2)
-            
-            print(f"Successfully generated {output_path}")
+            error, metrics = process_file(pdf_path, output_path, cache_dir, metrics_mode, args.shards)
+            if metrics and args.metrics:
+                _append_metrics(args.metrics, metrics)
+
+            if error:
+                print(f"Failed {filename}: {error}")
+            else:
+                print(f"Successfully generated {output_path}")
+
+    if cache_dir:
+        evict_cache(cache_dir, args.cache_max_mb)
 
 if __name__ == "__main__":
     main()
@@ -1,158 +1,744 @@
 # @title Challenge 1b: Persona-Driven Document Intelligence Engine (Final)
 import fitz  # PyMuPDF
-from sklearn.cluster import DBSCAN
-from sklearn.preprocessing import StandardScaler
 import numpy as np
-import pandas as pd
 import time
 import re
 import json
 import os
-from collections import Counter
+import sys
+import argparse
+import hashlib
+import pickle
+import queue
+import threading
+from collections import Counter, namedtuple
+import faiss
+import torch
+from sentence_transformers import SentenceTransformer
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain_community.embeddings import SentenceTransformerEmbeddings
 from langchain_community.vectorstores import FAISS
+from langchain_community.vectorstores.utils import DistanceStrategy
+from langchain_core.embeddings import Embeddings
 from datetime import datetime
+from bisect import bisect_right
+
+# In the container the shared modules sit next to this file; in the repository they live in ../common.
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'common'))
+from engine_support import JSONRequestHandler, record_stage, run_server
+from pdf_extraction import extract_page_layouts, get_all_blocks, run_hybrid_engine
 
 # ==============================================================================
-# CHALLENGE 1A HEADING EXTRACTION LOGIC (Encapsulated)
+# HEADING EXTRACTION (shared with Challenge 1a through pdf_extraction)
 # ==============================================================================
 
-def _get_document_baseline(doc):
-    if not doc or doc.is_closed or doc.page_count == 0: return 10
-    sizes = Counter()
-    for page in doc:
-        for block in page.get_text("dict").get("blocks", []):
-            if "lines" in block:
-                for line in block.get("lines", []):
-                    for span in line.get("spans", []):
-                        sizes[round(span["size"])] += len(span["text"])
-    return sizes.most_common(1)[0][0] if sizes else 10
-
-def _get_all_blocks(doc):
-    all_blocks = []
-    for page_num, page in enumerate(doc):
-        for block in page.get_text("dict").get("blocks", []):
-            block_text = " ".join(s["text"].strip() for l in block.get("lines", []) for s in l.get("spans", [])).strip()
-            if not block_text or block_text.isdigit():
-                continue
-            if "lines" in block and block["lines"] and "spans" in block["lines"][0] and block["lines"][0]["spans"]:
-                first_span = block["lines"][0]["spans"][0]
-                all_blocks.append({
-                    "text": block_text, "page": page_num + 1, "size": first_span["size"],
-                    "bold": "bold" in first_span["font"].lower() or "black" in first_span["font"].lower(),
-                    "y0": block['bbox'][1]
-                })
-    return all_blocks
-
-def run_heading_extraction(doc):
-    all_blocks = _get_all_blocks(doc)
-    if not all_blocks:
-        return []
-
-    baseline_size = _get_document_baseline(doc)
-    outline = []
-    numbered_pattern = re.compile(r"^\s*(?:(Appendix\s[A-Z])|(\d+(?:\.\d+)*)|([A-Z]))\s*[.:-]?\s*")
-
-    for i, block in enumerate(all_blocks):
-        text, is_bold, size = block['text'], block['bold'], block['size']
-        level, clean_text = None, text
-        match = numbered_pattern.match(text)
-        
-        if match:
-            if not is_bold and (len(text.split()) < 5 and size < baseline_size * 1.1):
-                continue
-            groups, clean_text = match.groups(), text[match.end():].strip()
-            num_str = next(g for g in groups if g is not None)
-            level = 1 if "Appendix" in num_str else min(num_str.count('.') + 1, 4)
-        elif is_bold and size > baseline_size * 1.15:
-            if len(text.split()) < 5 and (i + 1 >= len(all_blocks) or len(all_blocks[i+1]['text'].split()) < 15):
-                continue
-            level = 2 if size > baseline_size * 1.4 else 3
-        
-        if clean_text and level:
-            outline.append({"level": level, "text": clean_text, "page": block["page"], "y0": block["y0"]})
-    
-    final_outline = []
-    seen = set()
-    for h in sorted(outline, key=lambda x: (x['page'], x['y0'])):
-        if (h['text'], h['level']) not in seen:
-            final_outline.append({'level': f"H{h['level']}", 'text': h['text'], 'page': h['page']})
-            seen.add((h['text'], h['level']))
-    return final_outline
+def run_heading_extraction(layout):
+    """Rule-based headings over every block of a parsed document, each with the y0 of its block."""
+    return run_hybrid_engine(layout, get_all_blocks(layout, skip_toc_pages=False), with_positions=True)
 
 # ==============================================================================
 # CHALLENGE 1B CORE LOGIC
 # ==============================================================================
 
-def process_documents(input_dir):
-    all_docs_data = []
-    pdf_files = [f for f in os.listdir(input_dir) if f.lower().endswith('.pdf')]
+def iter_documents(input_dir, pdf_files=None, metrics=None):
+    """
+    Yields the headings and page texts of one PDF at a time. Both come from a
+    single parse of each page, which also records where every text block
+    starts in the page text and its y0, so chunks can be placed under the
+    heading above them.
+    """
+    if pdf_files is None:
+        pdf_files = [f for f in os.listdir(input_dir) if f.lower().endswith('.pdf')]
 
     for filename in pdf_files:
         pdf_path = os.path.join(input_dir, filename)
+        start = time.perf_counter()
         try:
             doc = fitz.open(pdf_path)
-            headings = run_heading_extraction(doc)
-            pages_text = [page.get_text() for page in doc]
-            
-            all_docs_data.append({
-                "filename": filename,
-                "headings": headings,
-                "pages_text": pages_text
-            })
+            layout = extract_page_layouts(doc, with_text=True)
             doc.close()
+            headings = run_heading_extraction(layout)
+            pages_text = [page["text"] for page in layout["pages"]]
         except Exception as e:
             print(f"Error processing {filename}: {e}")
-            
-    return all_docs_data
+            continue
+        record_stage(metrics, "parse", start, document=filename, pages=len(pages_text), headings=len(headings))
+        yield {
+            "filename": filename,
+            "headings": headings,
+            "pages_text": pages_text,
+            "text_positions": [(page["text_offsets"], page["text_y0"]) for page in layout["pages"]]
+        }
 
-def create_knowledge_base(docs_data):
-    text_splitter = RecursiveCharacterTextSplitter(chunk_size=500, chunk_overlap=50)
+def process_documents(input_dir, pdf_files=None, metrics=None):
+    return list(iter_documents(input_dir, pdf_files, metrics))
+
+MODEL_NAME = "all-MiniLM-L6-v2"
+MODEL_CACHE = "/app/model_cache"
+CHUNK_SIZE, CHUNK_OVERLAP = 500, 50
+# Bump when parsing or chunk metadata change, so saved knowledge bases are rebuilt.
+INGEST_VERSION = 2
+
+def _get_embeddings(embedding_cache_dir=None, backend="fp32", threads=None):
+    """
+    The chunk embedding model. `backend` "fp32" is the stock sentence-transformers
+    wrapper; "int8" is the length-bucketed, dynamically quantized CPU backend.
+    `threads` sets the number of intra-op threads torch uses for inference.
+    """
+    if threads:
+        torch.set_num_threads(threads)
+    if backend == "int8":
+        embeddings = BucketedEmbeddings(MODEL_NAME, MODEL_CACHE, quantize=True)
+    else:
+        # **FIX:** Point to the pre-downloaded model cache inside the container
+        model_kwargs = {'device': 'cpu'}
+        encode_kwargs = {'normalize_embeddings': False}
+        embeddings = SentenceTransformerEmbeddings(
+            model_name=MODEL_NAME,
+            model_kwargs=model_kwargs,
+            encode_kwargs=encode_kwargs,
+            cache_folder=MODEL_CACHE # This tells the script where to find the model
+        )
+    if embedding_cache_dir:
+        model_key = f"{_model_id(embeddings)}|normalize=False"
+        embeddings = ChunkEmbeddingCache(embeddings, embedding_cache_dir, model_key)
+    return embeddings
+
+def _model_id(embeddings):
+    """Identifies the vectors an embeddings object produces; int8 vectors do not mix with fp32 ones."""
+    if isinstance(embeddings, ChunkEmbeddingCache):
+        embeddings = embeddings.embeddings
+    if isinstance(embeddings, BucketedEmbeddings) and embeddings.quantized:
+        return f"{MODEL_NAME}|int8"
+    return MODEL_NAME
+
+def _build_chunks(docs_data):
+    """Splits page texts into chunks titled by the last heading at or above where each chunk starts."""
+    text_splitter = RecursiveCharacterTextSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP,
+                                                   add_start_index=True)
     all_chunks = []
 
     for data in docs_data:
-        current_heading = "Introduction"
+        heading_positions = [(h['page'], h['y0']) for h in data['headings']]
         for page_num, page_text in enumerate(data['pages_text'], 1):
-            page_headings = [h for h in data['headings'] if h['page'] == page_num]
-            if page_headings:
-                current_heading = page_headings[0]['text']
-
-            chunks = text_splitter.split_text(page_text)
-            for chunk in chunks:
+            offsets, y_positions = data['text_positions'][page_num - 1]
+            for chunk in text_splitter.create_documents([page_text]):
+                block = bisect_right(offsets, max(chunk.metadata["start_index"], 0)) - 1
+                y0 = y_positions[block] if block >= 0 else 0.0
+                heading = bisect_right(heading_positions, (page_num, y0)) - 1
                 all_chunks.append({
-                    "page_content": chunk,
+                    "page_content": chunk.page_content,
                     "metadata": {
                         "source": data['filename'],
                         "page": page_num,
-                        "section_title": current_heading
+                        "section_title": data['headings'][heading]['text'] if heading >= 0 else "Introduction"
                     }
                 })
+    return all_chunks
 
+def create_knowledge_base(docs_data, embeddings=None, metrics=None):
+    start = time.perf_counter()
+    all_chunks = _build_chunks(docs_data)
+    start = record_stage(metrics, "chunk", start, documents=len(docs_data), chunks=len(all_chunks))
     if not all_chunks:
         return None
 
-    # **FIX:** Point to the pre-downloaded model cache inside the container
-    model_kwargs = {'device': 'cpu'}
-    encode_kwargs = {'normalize_embeddings': False}
-    embeddings = SentenceTransformerEmbeddings(
-        model_name="all-MiniLM-L6-v2",
-        model_kwargs=model_kwargs,
-        encode_kwargs=encode_kwargs,
-        cache_folder="/app/model_cache" # This tells the script where to find the model
-    )
-    
     documents = [doc['page_content'] for doc in all_chunks]
     metadatas = [doc['metadata'] for doc in all_chunks]
     
-    vector_store = FAISS.from_texts(documents, embeddings, metadatas=metadatas)
+    vector_store = FAISS.from_texts(documents, embeddings or _get_embeddings(), metadatas=metadatas)
+    # The embeddings wrapper batches internally, so only the chunk count is known here.
+    record_stage(metrics, "embed_and_index", start, chunks=len(documents))
+    return vector_store
+
+# ==============================================================================
+# STREAMING INGEST-AND-EMBED PIPELINE
+# ==============================================================================
+# PDFs are parsed and chunked in a background thread that feeds a bounded
+# queue; the main thread embeds fixed-size batches and adds them to the index
+# as they arrive. Only `queue_size` chunks and one batch are held at a time,
+# and PyMuPDF parsing overlaps with model inference, which releases the GIL.
+
+_END_OF_STREAM = object()
+
+def _iter_in_background(iterable, maxsize):
+    """Runs `iterable` in a worker thread, handing its items over through a bounded queue."""
+    items = queue.Queue(maxsize=maxsize)
+    stop = threading.Event()
+
+    def put(item):
+        """Queues `item` unless the consumer has stopped; returns whether it was queued."""
+        while not stop.is_set():
+            try:
+                items.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        try:
+            for item in iterable:
+                if not put(item):
+                    return
+            put(_END_OF_STREAM)
+        except BaseException as e:
+            put(e)
+
+    worker = threading.Thread(target=produce, daemon=True)
+    worker.start()
+    try:
+        while True:
+            item = items.get()
+            if item is _END_OF_STREAM:
+                return
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+    finally:
+        stop.set()
+        worker.join()
+
+def iter_chunks(input_dir, pdf_files=None, metrics=None):
+    for data in iter_documents(input_dir, pdf_files, metrics):
+        yield from _build_chunks([data])
+
+def _batched(iterable, size):
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def stream_knowledge_base(input_dir, embeddings=None, batch_size=64, queue_size=1024, metrics=None):
+    """Builds the same vector store as create_knowledge_base without holding the whole corpus in memory."""
+    embeddings = embeddings or _get_embeddings()
+    vector_store = None
+    chunks = _iter_in_background(iter_chunks(input_dir, metrics=metrics), queue_size)
+    wait_seconds = embed_seconds = index_seconds = 0.0
+    batch_sizes = []
+    start = time.perf_counter()
+    for batch in _batched(chunks, batch_size):
+        embed_start = time.perf_counter()
+        wait_seconds += embed_start - start
+        texts = [chunk['page_content'] for chunk in batch]
+        metadatas = [chunk['metadata'] for chunk in batch]
+        text_embeddings = list(zip(texts, embeddings.embed_documents(texts)))
+        index_start = time.perf_counter()
+        if vector_store is None:
+            vector_store = FAISS.from_embeddings(text_embeddings, embeddings, metadatas=metadatas)
+        else:
+            vector_store.add_embeddings(text_embeddings, metadatas=metadatas)
+        start = time.perf_counter()
+        embed_seconds += index_start - embed_start
+        index_seconds += start - index_start
+        batch_sizes.append(len(batch))
+    if metrics is not None:
+        metrics.setdefault("stages", []).extend([
+            {"stage": "wait_for_chunks", "seconds": round(wait_seconds, 6)},
+            {"stage": "embed", "seconds": round(embed_seconds, 6), "chunks": sum(batch_sizes),
+             "batches": len(batch_sizes), "batch_size": batch_size, "last_batch_size": batch_sizes[-1] if batch_sizes else 0},
+            {"stage": "index_add", "seconds": round(index_seconds, 6)},
+        ])
     return vector_store
 
-def find_relevant_sections(vector_store, query, top_k=10):
+# ==============================================================================
+# CHUNK EMBEDDING CACHE
+# ==============================================================================
+# Vectors live in `<cache_dir>/<model key>/vectors.f32`, a raw float32 matrix
+# that is memory-mapped on load, and `keys.txt`, whose n-th line is the SHA-256
+# of the chunk text stored in row n. Both files are append-only; `dim.txt`
+# records the vector width.
+
+class ChunkEmbeddingCache(Embeddings):
+    """Wraps an Embeddings model so each distinct chunk text is encoded only once."""
+
+    def __init__(self, embeddings, cache_dir, model_key):
+        self.embeddings = embeddings
+        self.cache_dir = os.path.join(cache_dir, hashlib.sha256(model_key.encode()).hexdigest()[:16])
+        self.vectors_path = os.path.join(self.cache_dir, 'vectors.f32')
+        self.keys_path = os.path.join(self.cache_dir, 'keys.txt')
+        self.hits = self.misses = 0
+        self.rows = {}
+        self.matrix = None
+        os.makedirs(self.cache_dir, exist_ok=True)
+        if os.path.exists(self.keys_path):
+            with open(self.keys_path) as f:
+                self.rows = {line.strip(): i for i, line in enumerate(f)}
+        self._map()
+
+    def _map(self):
+        dim_path = os.path.join(self.cache_dir, 'dim.txt')
+        if not self.rows or not os.path.exists(self.vectors_path) or not os.path.exists(dim_path):
+            self.rows, self.matrix = {}, None
+            for path in (self.vectors_path, self.keys_path):
+                open(path, 'w').close()
+            return
+        with open(dim_path) as f:
+            dim = int(f.read())
+        rows_bytes = len(self.rows) * dim * 4
+        if os.path.getsize(self.vectors_path) > rows_bytes:
+            os.truncate(self.vectors_path, rows_bytes)  # drop vectors of an interrupted append
+        self.matrix = np.memmap(self.vectors_path, dtype=np.float32, mode='r', shape=(len(self.rows), dim))
+
+    def embed_documents(self, texts):
+        keys = [hashlib.sha256(t.encode('utf-8')).hexdigest() for t in texts]
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in self.rows and key not in missing:
+                missing[key] = text
+        self.misses += len(missing)
+        self.hits += len(keys) - len(missing)
+        if missing:
+            vectors = np.asarray(self.embeddings.embed_documents(list(missing.values())), dtype=np.float32)
+            if self.matrix is None:
+                with open(os.path.join(self.cache_dir, 'dim.txt'), 'w') as f:
+                    f.write(str(vectors.shape[1]))
+            with open(self.vectors_path, 'ab') as f:
+                f.write(vectors.tobytes())
+            with open(self.keys_path, 'a') as f:
+                f.writelines(key + '\n' for key in missing)
+            for key in missing:
+                self.rows[key] = len(self.rows)
+            self._map()
+        # Rows are gathered straight from the mapped file; nothing is re-encoded or deserialized.
+        return self.matrix[[self.rows[key] for key in keys]]
+
+    def embed_query(self, text):
+        return self.embeddings.embed_query(text)
+
+    def report(self):
+        total = self.hits + self.misses
+        rate = 100 * self.hits / total if total else 0.0
+        print(f"Embedding cache: {self.hits} hits, {self.misses} misses ({rate:.1f}% hit rate), "
+              f"{len(self.rows)} vectors stored in {self.cache_dir}")
+
+# ==============================================================================
+# QUANTIZED CPU EMBEDDING BACKEND
+# ==============================================================================
+# Texts are tokenized once, sorted by token count and cut into batches whose
+# padded size (batch length x longest sequence) stays under a token budget, so
+# short chunks are never padded to the length of long ones and batches of short
+# chunks can be larger. With `quantize`, the model's Linear layers run with
+# dynamically quantized int8 weights, which is where most of the CPU time goes.
+
+class BucketedEmbeddings(Embeddings):
+    """Sentence-transformer inference on CPU over length-bucketed batches, optionally with int8 weights."""
+
+    def __init__(self, model_name=MODEL_NAME, cache_folder=MODEL_CACHE, quantize=True, max_batch_tokens=16384,
+                 max_batch_size=256):
+        self.model = SentenceTransformer(model_name, cache_folder=cache_folder, device='cpu')
+        self.model.eval()
+        self.quantized = quantize
+        if quantize:
+            torch.ao.quantization.quantize_dynamic(self.model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+        self.tokenizer = self.model.tokenizer
+        self.max_batch_tokens, self.max_batch_size = max_batch_tokens, max_batch_size
+
+    def _buckets(self, lengths):
+        """Yields index batches in ascending length order, each within the padded token budget."""
+        batch = []
+        for i in np.argsort(lengths, kind='stable'):
+            if batch and ((len(batch) + 1) * lengths[i] > self.max_batch_tokens or len(batch) == self.max_batch_size):
+                yield batch
+                batch = []
+            batch.append(i)
+        if batch:
+            yield batch
+
+    def embed_documents(self, texts):
+        texts = list(texts)
+        if not texts:
+            return np.empty((0, self.model.get_sentence_embedding_dimension()), dtype=np.float32)
+        encoded = self.tokenizer(texts, truncation=True, max_length=self.model.max_seq_length)
+        vectors = None
+        for batch in self._buckets([len(ids) for ids in encoded['input_ids']]):
+            features = self.tokenizer.pad({key: [encoded[key][i] for i in batch] for key in encoded},
+                                          return_tensors='pt')
+            with torch.inference_mode():
+                output = self.model(dict(features))['sentence_embedding'].numpy()
+            if vectors is None:
+                vectors = np.empty((len(texts), output.shape[1]), dtype=np.float32)
+            vectors[batch] = output
+        return vectors
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0].tolist()
+
+def embedding_fidelity(reference, candidate, texts):
+    """Cosine agreement between two embeddings backends over `texts` (mean, min and 1st percentile)."""
+    a = np.asarray(reference.embed_documents(texts), dtype=np.float32)
+    b = np.asarray(candidate.embed_documents(texts), dtype=np.float32)
+    norms = np.linalg.norm(a, axis=1) * np.linalg.norm(b, axis=1)
+    cosines = (a * b).sum(axis=1) / np.maximum(norms, 1e-12)
+    return {"texts": len(texts), "mean_cosine": float(cosines.mean()), "min_cosine": float(cosines.min()),
+            "p01_cosine": float(np.percentile(cosines, 1))}
+
+# ==============================================================================
+# VECTOR INDEX BACKENDS
+# ==============================================================================
+# FAISS.from_texts always builds an exact flat L2 index. For large corpora the
+# index can be rebuilt as IVF (inverted lists, `nprobe` lists searched per
+# query) or HNSW (graph, `ef_search` candidates per query), optionally storing
+# int8 scalar-quantized ("sq8") or product-quantized ("pq") codes, and scored
+# by inner product over L2-normalized vectors (cosine similarity).
+
+DEFAULT_INDEX_CONFIG = {"backend": "flat", "quantization": None, "metric": "l2",
+                        "nlist": 1024, "nprobe": 16, "hnsw_m": 32, "ef_search": 64, "pq_m": 48}
+
+def _index_factory_string(config, dim, n_vectors):
+    """Builds the faiss.index_factory spec, shrinking IVF/PQ sizes that `n_vectors` cannot train."""
+    quantization = config["quantization"]
+    pq_m = max(m for m in range(1, min(config["pq_m"], dim) + 1) if dim % m == 0)
+    # k-means wants ~39 training points per centroid; PQ falls back to 4-bit codes, then to no quantization.
+    pq_bits = 8 if n_vectors >= 39 * 256 else 4
+    if quantization == "pq" and n_vectors < 39 * 16:
+        print(f"Too few vectors ({n_vectors}) to train product quantization; storing full vectors.")
+        quantization = None
+    codes = {None: "Flat", "sq8": "SQ8", "pq": f"PQ{pq_m}x{pq_bits}"}[quantization]
+
+    if config["backend"] == "ivf":
+        nlist = max(1, min(config["nlist"], n_vectors // 39))
+        return f"IVF{nlist},{codes}"
+    if config["backend"] == "hnsw":
+        if quantization == "pq":
+            return f"HNSW{config['hnsw_m']}_PQ{pq_m}x{pq_bits}"
+        return f"HNSW{config['hnsw_m']}" + ("" if codes == "Flat" else f",{codes}")
+    return codes
+
+def _configure_search(index, config):
+    """Applies the query-time knobs; parameters the index type does not have are skipped."""
+    params = faiss.ParameterSpace()
+    for name, value in (("nprobe", config["nprobe"]), ("efSearch", config["ef_search"])):
+        try:
+            params.set_index_parameter(index, name, value)
+        except RuntimeError:
+            pass
+
+def _uses_inner_product(config):
+    return config["metric"] == "ip"
+
+def apply_index_config(vector_store, config):
+    """Rebuilds the flat index of `vector_store` with the configured backend, in place."""
+    if vector_store is None or config == DEFAULT_INDEX_CONFIG:
+        return vector_store
+    vectors = vector_store.index.reconstruct_n(0, vector_store.index.ntotal)
+    metric = faiss.METRIC_L2
+    if _uses_inner_product(config):
+        faiss.normalize_L2(vectors)
+        metric = faiss.METRIC_INNER_PRODUCT
+        vector_store._normalize_L2 = True
+        vector_store.distance_strategy = DistanceStrategy.MAX_INNER_PRODUCT
+    spec = _index_factory_string(config, vectors.shape[1], len(vectors))
+    index = faiss.index_factory(vectors.shape[1], spec, metric)
+    if not index.is_trained:
+        index.train(vectors)
+    index.add(vectors)
+    _configure_search(index, config)
+    vector_store.index = index
+    print(f"Vector index rebuilt as {spec} ({'inner product' if metric == faiss.METRIC_INNER_PRODUCT else 'L2'}).")
+    return vector_store
+
+def _higher_is_better(vector_store):
+    return vector_store.distance_strategy == DistanceStrategy.MAX_INNER_PRODUCT
+
+# ==============================================================================
+# PERSISTENT KNOWLEDGE BASE
+# ==============================================================================
+# The vector store is saved in `store_dir` as index.faiss/index.pkl (the layout
+# FAISS.save_local writes) plus manifest.json, which records the content hash
+# and docstore ids of every source PDF. Later runs only embed new or changed
+# PDFs and drop the vectors of removed ones.
+
+def _file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+# Query-time knobs (nprobe, ef_search) are applied on load and do not belong here.
+INDEX_BUILD_FIELDS = ("backend", "quantization", "metric", "nlist", "hnsw_m", "pq_m")
+
+def _store_config(index_config=DEFAULT_INDEX_CONFIG, model_id=MODEL_NAME):
+    """Settings that invalidate the whole store when they change."""
+    return {"model": model_id, "chunk_size": CHUNK_SIZE, "chunk_overlap": CHUNK_OVERLAP,
+            "index": {field: index_config[field] for field in INDEX_BUILD_FIELDS},
+            "ingest_version": INGEST_VERSION}
+
+def _load_manifest(store_dir, index_config=DEFAULT_INDEX_CONFIG, model_id=MODEL_NAME):
+    try:
+        with open(os.path.join(store_dir, 'manifest.json')) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if manifest.get("config") != _store_config(index_config, model_id) or not os.path.exists(os.path.join(store_dir, 'index.faiss')):
+        return None
+    return manifest
+
+def _save_knowledge_base(vector_store, manifest, store_dir):
+    """
+    Writes the store next to the old one and renames it into place. A store a
+    running process has memory-mapped keeps its unlinked files instead of
+    being truncated under it. The manifest goes last, so a run interrupted
+    between the renames leaves no manifest and the next run rebuilds.
+    """
+    os.makedirs(store_dir, exist_ok=True)
+    paths = {name: os.path.join(store_dir, name) for name in ('index.faiss', 'index.pkl', 'manifest.json')}
+    tmp_paths = {name: f"{path}.{os.getpid()}.tmp" for name, path in paths.items()}
+    faiss.write_index(vector_store.index, tmp_paths['index.faiss'])
+    with open(tmp_paths['index.pkl'], 'wb') as f:
+        pickle.dump((vector_store.docstore, vector_store.index_to_docstore_id), f)
+    with open(tmp_paths['manifest.json'], 'w') as f:
+        json.dump(manifest, f, indent=2)
+    if os.path.exists(paths['manifest.json']):
+        os.remove(paths['manifest.json'])
+    for name in ('index.faiss', 'index.pkl', 'manifest.json'):
+        os.replace(tmp_paths[name], paths[name])
+
+def _load_knowledge_base(store_dir, embeddings, mmap=False, index_config=DEFAULT_INDEX_CONFIG):
+    """Loads a saved store; with `mmap` the index is mapped read-only instead of read into memory."""
+    index_path = os.path.join(store_dir, 'index.faiss')
+    index = None
+    if mmap:
+        try:
+            # IO_FLAG_MMAP alone only maps IVF inverted lists; flat codes (flat, SQ8, PQ, HNSW storage)
+            # need IO_FLAG_MMAP_IFC, which exists from faiss 1.10 on.
+            index = faiss.read_index(index_path, faiss.IO_FLAG_MMAP_IFC | faiss.IO_FLAG_READ_ONLY)
+        except RuntimeError:
+            index = None  # this index type cannot be mapped; fall back to a normal read
+    if index is None:
+        index = faiss.read_index(index_path)
+    with open(os.path.join(store_dir, 'index.pkl'), 'rb') as f:
+        docstore, index_to_docstore_id = pickle.load(f)
+    _configure_search(index, index_config)
+    if _uses_inner_product(index_config):
+        return FAISS(embeddings, index, docstore, index_to_docstore_id, normalize_L2=True,
+                     distance_strategy=DistanceStrategy.MAX_INNER_PRODUCT)
+    return FAISS(embeddings, index, docstore, index_to_docstore_id)
+
+def _add_documents(vector_store, embeddings, docs_data, manifest, hashes):
+    """Embeds `docs_data` into `vector_store` (creating it if None) and records their ids."""
+    all_chunks = _build_chunks(docs_data)
+    for data in docs_data:
+        manifest["documents"][data['filename']] = {"sha256": hashes[data['filename']], "ids": []}
+    if not all_chunks:
+        return vector_store
+
+    ids = []
+    for chunk in all_chunks:
+        filename = chunk['metadata']['source']
+        entry = manifest["documents"][filename]
+        # Byte-identical PDFs under different names must not share ids.
+        name_hash = hashlib.sha256(filename.encode('utf-8')).hexdigest()[:8]
+        ids.append(f"{entry['sha256'][:16]}-{name_hash}-{len(entry['ids'])}")
+        entry['ids'].append(ids[-1])
+    documents = [doc['page_content'] for doc in all_chunks]
+    metadatas = [doc['metadata'] for doc in all_chunks]
+    if vector_store is None:
+        return FAISS.from_texts(documents, embeddings, metadatas=metadatas, ids=ids)
+    vector_store.add_texts(documents, metadatas=metadatas, ids=ids)
+    return vector_store
+
+def _remove_vectors(vector_store, ids, index_config):
+    """
+    Drops the chunks `ids` from `vector_store`; returns None once it is empty.
+    The docstore map assumes index positions 0..n-1. Flat indexes compact on
+    removal, but IVF keeps the original ids and HNSW cannot remove at all, so
+    those are rebuilt from their surviving vectors instead of re-embedding.
+    """
+    if index_config["backend"] == "flat":
+        vector_store.delete(ids)
+        return vector_store if vector_store.index.ntotal else None
+
+    index = vector_store.index
+    try:
+        faiss.extract_index_ivf(index).make_direct_map()
+    except RuntimeError:
+        pass  # not an IVF index; HNSW reconstructs from its storage
+    removed = set(ids)
+    keep = [position for position, doc_id in sorted(vector_store.index_to_docstore_id.items())
+            if doc_id not in removed]
+    vector_store.docstore.delete([doc_id for doc_id in vector_store.index_to_docstore_id.values() if doc_id in removed])
+    if not keep:
+        return None
+    vectors = index.reconstruct_n(0, index.ntotal)[keep]
+    vector_store.index = faiss.IndexFlatL2(vectors.shape[1])
+    vector_store.index.add(vectors)
+    vector_store.index_to_docstore_id = {i: vector_store.index_to_docstore_id[position]
+                                         for i, position in enumerate(keep)}
+    return apply_index_config(vector_store, index_config)
+
+def load_or_update_knowledge_base(input_dir, store_dir, embeddings=None, metrics=None,
+                                  index_config=DEFAULT_INDEX_CONFIG):
+    """
+    Returns the knowledge base for the PDFs in `input_dir`, reusing the store
+    saved in `store_dir`. Only added or changed PDFs are parsed and embedded.
+    """
+    start = time.perf_counter()
+    embeddings = embeddings or _get_embeddings()
+    pdf_files = sorted(f for f in os.listdir(input_dir) if f.lower().endswith('.pdf'))
+    hashes = {f: _file_sha256(os.path.join(input_dir, f)) for f in pdf_files}
+
+    model_id = _model_id(embeddings)
+    manifest = _load_manifest(store_dir, index_config, model_id)
+    if manifest is not None:
+        known = manifest["documents"]
+        stale = [f for f in known if hashes.get(f) != known[f]["sha256"]]
+        if not stale and set(known) == set(hashes):
+            print("Knowledge base is up to date; loading saved index.")
+            vector_store = _load_knowledge_base(store_dir, embeddings, mmap=True, index_config=index_config)
+            record_stage(metrics, "load_store", start, documents=len(hashes), vectors=vector_store.index.ntotal)
+            return vector_store
+        vector_store = _load_knowledge_base(store_dir, embeddings, index_config=index_config)
+        stale_ids = [i for f in stale for i in manifest["documents"].pop(f)["ids"]]
+        if stale_ids:
+            vector_store = _remove_vectors(vector_store, stale_ids, index_config)
+    if manifest is None:
+        manifest = {"config": _store_config(index_config, model_id), "documents": {}}
+        vector_store = None
+        stale = []
+    fresh = vector_store is None
+    to_embed = [f for f in pdf_files if f not in manifest["documents"]]
+    print(f"Updating knowledge base: {len(to_embed)} to embed, {len(stale)} stale document(s) dropped.")
+    start = record_stage(metrics, "load_store", start, documents=len(hashes), to_embed=len(to_embed), stale=len(stale))
+
+    docs_data = process_documents(input_dir, to_embed, metrics)
+    start = time.perf_counter()
+    vector_store = _add_documents(vector_store, embeddings, docs_data, manifest, hashes)
+    if fresh:
+        vector_store = apply_index_config(vector_store, index_config)
+    start = record_stage(metrics, "embed_and_index", start, documents=len(docs_data))
+    if vector_store is None:
+        return None
+    _save_knowledge_base(vector_store, manifest, store_dir)
+    record_stage(metrics, "save_store", start, vectors=vector_store.index.ntotal)
+    return vector_store if vector_store.index_to_docstore_id else None
+
+# ==============================================================================
+# LEXICAL PREFILTER
+# ==============================================================================
+# A BM25 inverted index over the chunk texts of the vector store, keyed by index
+# position. It picks the `candidates` chunks that best match the query's words;
+# only those vectors are then scored against the query embedding. Queries with
+# fewer than top_k matching chunks fall back to the full dense search.
+
+STOPWORDS = frozenset("""a an and are as at be by for from has have in into is it its of on or that the
+their them they this to was were will with you your""".split())
+
+def _tokenize(text):
+    return [t for t in re.findall(r"[a-z0-9]+", text.lower()) if len(t) > 1 and t not in STOPWORDS]
+
+class LexicalPrefilter:
+    """BM25 candidate selection for two-stage retrieval over `vector_store`."""
+
+    def __init__(self, vector_store, candidates=200, k1=1.2, b=0.75):
+        self.candidates = candidates
+        self.size = vector_store.index.ntotal
+        postings = {}
+        lengths = np.zeros(self.size, dtype=np.float32)
+        for position, doc_id in vector_store.index_to_docstore_id.items():
+            terms = Counter(_tokenize(vector_store.docstore.search(doc_id).page_content))
+            lengths[position] = sum(terms.values())
+            for term, tf in terms.items():
+                entry = postings.setdefault(term, ([], []))
+                entry[0].append(position)
+                entry[1].append(tf)
+        # Document-length normalization and IDF are folded in once, so a query only sums weights.
+        norm = k1 * (1 - b + b * lengths / max(lengths.mean(), 1.0))
+        self.postings = {}
+        for term, (positions, tfs) in postings.items():
+            positions, tfs = np.array(positions, dtype=np.int64), np.array(tfs, dtype=np.float32)
+            idf = np.log1p((self.size - len(positions) + 0.5) / (len(positions) + 0.5))
+            self.postings[term] = (positions, idf * tfs * (k1 + 1) / (tfs + norm[positions]))
+        try:
+            faiss.extract_index_ivf(vector_store.index).make_direct_map()  # IVF needs it to reconstruct
+        except RuntimeError:
+            pass
+
+    def search(self, query):
+        """Returns the index positions of the best-matching chunks, best first."""
+        scores = np.zeros(self.size, dtype=np.float32)
+        for term in set(_tokenize(query)):
+            if term in self.postings:
+                positions, weights = self.postings[term]
+                scores[positions] += weights
+        matched = np.flatnonzero(scores)
+        if len(matched) > self.candidates:
+            matched = matched[np.argpartition(-scores[matched], self.candidates - 1)[:self.candidates]]
+        return matched[np.argsort(-scores[matched], kind='stable')]
+
+def _rescore_candidates(vector_store, query_vector, positions, top_k):
+    """Dense scores of the candidate vectors only, ordered like index.search results."""
+    vectors = vector_store.index.reconstruct_batch(positions)
+    if _higher_is_better(vector_store):
+        scores = vectors @ query_vector
+        order = np.argsort(-scores, kind='stable')[:top_k]
+    else:
+        scores = ((vectors - query_vector) ** 2).sum(axis=1)
+        order = np.argsort(scores, kind='stable')[:top_k]
+    return scores[order], positions[order]
+
+# ==============================================================================
+# RETRIEVAL
+# ==============================================================================
+
+def find_relevant_sections(vector_store, query, top_k=10, metrics=None, prefilter=None):
     if not vector_store:
         return []
+    if prefilter is not None:
+        return find_relevant_sections_batch(vector_store, [query], top_k, metrics, prefilter)[0]
+    start = time.perf_counter()
     results_with_scores = vector_store.similarity_search_with_score(query, k=top_k)
-    
+    record_stage(metrics, "search", start, top_k=top_k, vectors=vector_store.index.ntotal)
+    return _rank_results(results_with_scores, _higher_is_better(vector_store))
+
+def find_relevant_sections_batch(vector_store, queries, top_k=10, metrics=None, prefilter=None):
+    """
+    Answers many queries at once: one batched embedding call and one matrix
+    search over the index. Returns one ranked result list per query, identical
+    to calling find_relevant_sections for each. With a LexicalPrefilter, queries
+    are scored only against their BM25 candidates where there are enough.
+    """
+    if not vector_store or not queries:
+        return [[] for _ in queries]
+    start = time.perf_counter()
+    embeddings = vector_store.embeddings
+    if isinstance(embeddings, ChunkEmbeddingCache):
+        embeddings = embeddings.embeddings  # queries should not fill the chunk cache
+    vectors = np.asarray(embeddings.embed_documents(list(queries)), dtype=np.float32)
+    start = record_stage(metrics, "embed_queries", start, queries=len(queries))
+    if vector_store._normalize_L2:
+        faiss.normalize_L2(vectors)
+
+    rows = [None] * len(queries)
+    if prefilter is not None:
+        for i, query in enumerate(queries):
+            positions = prefilter.search(query)
+            if len(positions) >= top_k:
+                rows[i] = _rescore_candidates(vector_store, vectors[i], positions, top_k)
+        start = record_stage(metrics, "lexical_prefilter", start, queries=len(queries),
+                             fallbacks=rows.count(None), candidates=prefilter.candidates)
+    dense = [i for i, row in enumerate(rows) if row is None]
+    if dense:
+        scores, indices = vector_store.index.search(vectors[dense], top_k)
+        for i, row_scores, row_indices in zip(dense, scores, indices):
+            rows[i] = (row_scores, row_indices)
+    record_stage(metrics, "search", start, queries=len(dense), top_k=top_k, vectors=vector_store.index.ntotal)
+
+    batch_results = []
+    for row_scores, row_indices in rows:
+        results_with_scores = [
+            (vector_store.docstore.search(vector_store.index_to_docstore_id[i]), score)
+            for i, score in zip(row_indices, row_scores) if i != -1
+        ]
+        batch_results.append(_rank_results(results_with_scores, _higher_is_better(vector_store)))
+    return batch_results
+
+def _rank_results(results_with_scores, higher_is_better=False):
     final_results = []
     for doc, score in results_with_scores:
         final_results.append({
@@ -163,37 +749,14 @@ def find_relevant_sections(vector_store, query, top_k=10):
             "relevance_score": float(score)
         })
     
-    ranked_results = sorted(final_results, key=lambda x: x['relevance_score'])
+    ranked_results = sorted(final_results, key=lambda x: x['relevance_score'], reverse=higher_is_better)
     for i, item in enumerate(ranked_results):
         item['importance_rank'] = i + 1
 
     return ranked_results
 
-def main():
-    input_dir = '/app/input'
-    output_dir = '/app/output'
-    os.makedirs(output_dir, exist_ok=True)
-
-    try:
-        with open(os.path.join(input_dir, 'persona.txt'), 'r') as f:
-            persona = f.read().strip()
-        with open(os.path.join(input_dir, 'job.txt'), 'r') as f:
-            job_to_be_done = f.read().strip()
-        pdf_files = sorted([f for f in os.listdir(input_dir) if f.lower().endswith('.pdf')])
-    except FileNotFoundError as e:
-        print(f"Error: Missing input file - {e.filename}")
-        return
-
-    print("Processing documents to extract text and structure...")
-    docs_data = process_documents(input_dir)
-    
-    print("Creating knowledge base and vector store...")
-    vector_store = create_knowledge_base(docs_data)
-    
-    print(f"Searching for sections relevant to the job: '{job_to_be_done[:50]}...'")
-    relevant_sections = find_relevant_sections(vector_store, job_to_be_done)
-
-    output_data = {
+def build_output(pdf_files, persona, job_to_be_done, relevant_sections):
+    return {
         "metadata": {
             "input_documents": pdf_files,
             "persona": persona,
@@ -217,10 +780,263 @@ def main():
         ]
     }
 
-    output_path = os.path.join(output_dir, 'output.json')
-    with open(output_path, 'w') as f:
-        json.dump(output_data, f, indent=4)
+# ==============================================================================
+# MULTI-QUERY BATCH MODE
+# ==============================================================================
+# Many persona/job pairs against one corpus: the knowledge base is built once
+# and each group of queries is answered with one embedding call and one index
+# search. Records are yielded in input order so they can be written as they
+# are produced.
+
+def read_queries(path):
+    """Reads a JSONL file of {"job": ..., "persona": ...} objects; "id" and "top_k" are optional."""
+    queries = []
+    with open(path) as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            query = json.loads(line)
+            if not isinstance(query, dict) or "job" not in query:
+                raise ValueError(f"{path}:{line_number}: expected {{\"job\": ..., \"persona\": ...}}")
+            queries.append(query)
+    return queries
+
+def answer_queries(vector_store, pdf_files, queries, prefilter=None, metrics=None, batch_size=1024):
+    """Yields one output record per query, in input order, answering `batch_size` queries at a time."""
+    for group in _batched(queries, batch_size):
+        top_k = max(int(query.get("top_k", 10)) for query in group)
+        results = find_relevant_sections_batch(vector_store, [query["job"] for query in group], top_k,
+                                               metrics, prefilter)
+        for query, sections in zip(group, results):
+            record = build_output(pdf_files, query.get("persona", ""), query["job"],
+                                  sections[:int(query.get("top_k", 10))])
+            if "id" in query:
+                record["id"] = query["id"]
+            yield record
+
+# ==============================================================================
+# WARM SERVICE MODE
+# ==============================================================================
+# A long-lived daemon that keeps the libraries, the sentence-transformer model
+# and the knowledge base loaded. Queries that arrive within `batch_window_ms`
+# of each other are answered together by find_relevant_sections_batch.
+#
+#   POST /query   {"persona": "...", "job": "...", "top_k": 10}
+#   POST /reload  re-ingests the input directory (incrementally with a store)
+#   GET  /health
+
+# /reload rebinds QueryBatcher.knowledge_base to a new tuple in one step, and every batch reads it once,
+# so a query never pairs one load's vector store with another load's prefilter or file list.
+KnowledgeBase = namedtuple("KnowledgeBase", "pdf_files vector_store prefilter")
+
+class _QueryBatcher:
+    """Collects concurrent queries and answers them with one embedding call and one index search."""
+
+    def __init__(self, knowledge_base, batch_window_ms=5, max_batch=64):
+        self.knowledge_base = knowledge_base
+        self.batch_window = batch_window_ms / 1000
+        self.max_batch = max_batch
+        self.requests = queue.Queue()
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def query(self, job, top_k):
+        """Returns the ranked sections and the knowledge base that answered them."""
+        done = threading.Event()
+        request = {"job": job, "top_k": top_k, "done": done}
+        self.requests.put(request)
+        done.wait()
+        if "error" in request:
+            raise request["error"]
+        return request["result"], request["knowledge_base"]
+
+    def _run(self):
+        while True:
+            batch = [self.requests.get()]
+            deadline = time.monotonic() + self.batch_window
+            while len(batch) < self.max_batch:
+                try:
+                    batch.append(self.requests.get(timeout=max(0.0, deadline - time.monotonic())))
+                except queue.Empty:
+                    break
+            knowledge_base = self.knowledge_base
+            try:
+                top_k = max(r["top_k"] for r in batch)
+                results = find_relevant_sections_batch(knowledge_base.vector_store,
+                                                       [r["job"] for r in batch], top_k=top_k,
+                                                       prefilter=knowledge_base.prefilter)
+                for request, ranked in zip(batch, results):
+                    request["result"], request["knowledge_base"] = ranked[:request["top_k"]], knowledge_base
+            except Exception as e:
+                for request in batch:
+                    request["error"] = e
+            for request in batch:
+                request["done"].set()
+
+def _make_service_handler(batcher, reload_lock, load):
+    class QueryHandler(JSONRequestHandler):
+        def do_GET(self):
+            if self.path == '/health':
+                self._reply(200, {"status": "ok", "documents": len(batcher.knowledge_base.pdf_files)})
+            else:
+                self._reply(404, {"error": f"unknown endpoint {self.path}"})
+
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+            try:
+                if self.path == '/reload':
+                    with reload_lock:
+                        batcher.knowledge_base = load()
+                    self._reply(200, {"status": "reloaded", "documents": len(batcher.knowledge_base.pdf_files)})
+                elif self.path == '/query':
+                    request = json.loads(body)
+                    job, persona = request["job"], request.get("persona", "")
+                    sections, knowledge_base = batcher.query(job, int(request.get("top_k", 10)))
+                    self._reply(200, build_output(knowledge_base.pdf_files, persona, job, sections))
+                else:
+                    self._reply(404, {"error": f"unknown endpoint {self.path}"})
+            except (ValueError, KeyError) as e:
+                self._reply(400, {"error": f"expected {{\"job\": ..., \"persona\": ...}}: {e}"})
+            except Exception as e:
+                self._reply(500, {"error": f"{type(e).__name__}: {e}"})
+
+    return QueryHandler
+
+def serve(input_dir, host='127.0.0.1', port=8081, socket_path=None, store_dir=None, embedding_cache=None,
+          batch_window_ms=5, max_batch=64, index_config=DEFAULT_INDEX_CONFIG, prefilter_candidates=0,
+          embedding_backend="fp32", embedding_threads=None):
+    """Runs the query service on a localhost port or, with `socket_path`, a Unix socket."""
+    embeddings = _get_embeddings(embedding_cache, embedding_backend, embedding_threads)
+
+    def load():
+        pdf_files = sorted(f for f in os.listdir(input_dir) if f.lower().endswith('.pdf'))
+        if store_dir:
+            vector_store = load_or_update_knowledge_base(input_dir, store_dir, embeddings, index_config=index_config)
+        else:
+            vector_store = apply_index_config(stream_knowledge_base(input_dir, embeddings), index_config)
+        prefilter = LexicalPrefilter(vector_store, prefilter_candidates) if vector_store and prefilter_candidates else None
+        return KnowledgeBase(pdf_files, vector_store, prefilter)
+
+    batcher = _QueryBatcher(load(), batch_window_ms, max_batch)
+    handler = _make_service_handler(batcher, threading.Lock(), load)
+    run_server(handler, host, port, socket_path, "Query service")
+
+def main():
+    parser = argparse.ArgumentParser(description="Persona-driven section retrieval over a PDF collection.")
+    parser.add_argument('--input-dir', default='/app/input')
+    parser.add_argument('--output-dir', default='/app/output')
+    parser.add_argument('--store-dir', default=None,
+                        help="persist the knowledge base here and update it incrementally on later runs")
+    parser.add_argument('--embedding-cache', default=None,
+                        help="reuse chunk embeddings stored here across documents and runs")
+    parser.add_argument('--batch-size', type=int, default=64,
+                        help="number of chunks embedded and indexed together while streaming")
+    parser.add_argument('--metrics', default=None, metavar='PATH',
+                        help="append this run's stage timings and counters to a JSONL file")
+    parser.add_argument('--metrics-in-output', action='store_true',
+                        help="embed the run's metrics in output.json under `_metrics`")
+    parser.add_argument('--serve', action='store_true',
+                        help="run as a warm query service over the documents in --input-dir")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8081)
+    parser.add_argument('--socket', default=None, help="serve on this Unix socket instead of a TCP port")
+    parser.add_argument('--batch-window-ms', type=float, default=5,
+                        help="how long the service waits to group concurrent queries into one batch")
+    parser.add_argument('--index', choices=['flat', 'ivf', 'hnsw'], default='flat', help="vector index backend")
+    parser.add_argument('--quantization', choices=['sq8', 'pq'], default=None,
+                        help="store int8 scalar-quantized or product-quantized vectors")
+    parser.add_argument('--metric', choices=['l2', 'ip'], default='l2',
+                        help="l2 distance, or inner product over normalized vectors (cosine)")
+    parser.add_argument('--nlist', type=int, default=DEFAULT_INDEX_CONFIG["nlist"], help="IVF lists")
+    parser.add_argument('--nprobe', type=int, default=DEFAULT_INDEX_CONFIG["nprobe"], help="IVF lists searched per query")
+    parser.add_argument('--hnsw-m', type=int, default=DEFAULT_INDEX_CONFIG["hnsw_m"], help="HNSW graph degree")
+    parser.add_argument('--ef-search', type=int, default=DEFAULT_INDEX_CONFIG["ef_search"], help="HNSW search breadth")
+    parser.add_argument('--pq-m', type=int, default=DEFAULT_INDEX_CONFIG["pq_m"], help="PQ sub-quantizers")
+    parser.add_argument('--embedding-backend', choices=['fp32', 'int8'], default='fp32',
+                        help="int8: length-bucketed batches on a dynamically quantized copy of the model")
+    parser.add_argument('--embedding-threads', type=int, default=None, metavar='N',
+                        help="intra-op threads for embedding inference (default: torch's choice)")
+    parser.add_argument('--queries', default=None, metavar='PATH',
+                        help="answer every persona/job pair in this JSONL file and write outputs.jsonl")
+    parser.add_argument('--prefilter', type=int, default=0, metavar='N',
+                        help="score only the N best keyword (BM25) matches of the job; 0 searches every chunk")
+    args = parser.parse_args()
+    input_dir, output_dir = args.input_dir, args.output_dir
+    index_config = {"backend": args.index, "quantization": args.quantization, "metric": args.metric,
+                    "nlist": args.nlist, "nprobe": args.nprobe, "hnsw_m": args.hnsw_m,
+                    "ef_search": args.ef_search, "pq_m": args.pq_m}
+
+    if args.serve:
+        serve(input_dir, args.host, args.port, args.socket, store_dir=args.store_dir,
+              embedding_cache=args.embedding_cache, batch_window_ms=args.batch_window_ms, index_config=index_config,
+              prefilter_candidates=args.prefilter, embedding_backend=args.embedding_backend,
+              embedding_threads=args.embedding_threads)
+        return
+
+    os.makedirs(output_dir, exist_ok=True)
+
+    try:
+        if args.queries:
+            queries = read_queries(args.queries)
+        else:
+            with open(os.path.join(input_dir, 'persona.txt'), 'r') as f:
+                persona = f.read().strip()
+            with open(os.path.join(input_dir, 'job.txt'), 'r') as f:
+                job_to_be_done = f.read().strip()
+        pdf_files = sorted([f for f in os.listdir(input_dir) if f.lower().endswith('.pdf')])
+    except FileNotFoundError as e:
+        print(f"Error: Missing input file - {e.filename}")
+        return
+    except ValueError as e:
+        print(f"Error: {e}")
+        return
+
+    metrics = {"documents": len(pdf_files)} if args.metrics or args.metrics_in_output else None
+    run_start = time.perf_counter()
+    embeddings = _get_embeddings(args.embedding_cache, args.embedding_backend, args.embedding_threads)
+    record_stage(metrics, "load_model", run_start, backend=args.embedding_backend, threads=torch.get_num_threads())
+    if args.store_dir:
+        vector_store = load_or_update_knowledge_base(input_dir, args.store_dir, embeddings, metrics=metrics,
+                                                     index_config=index_config)
+    else:
+        print("Streaming documents into the knowledge base...")
+        vector_store = stream_knowledge_base(input_dir, embeddings, batch_size=args.batch_size, metrics=metrics)
+        vector_store = apply_index_config(vector_store, index_config)
+    
+    prefilter = None
+    if vector_store and args.prefilter:
+        start = time.perf_counter()
+        prefilter = LexicalPrefilter(vector_store, args.prefilter)
+        record_stage(metrics, "build_lexical_index", start, terms=len(prefilter.postings))
+
+    if args.queries:
+        print(f"Answering {len(queries)} queries from {args.queries}...")
+        output_path = os.path.join(output_dir, 'outputs.jsonl')
+        with open(output_path, 'w') as f:
+            for record in answer_queries(vector_store, pdf_files, queries, prefilter=prefilter, metrics=metrics):
+                f.write(json.dumps(record) + "\n")
+        output_data = None
+    else:
+        print(f"Searching for sections relevant to the job: '{job_to_be_done[:50]}...'")
+        relevant_sections = find_relevant_sections(vector_store, job_to_be_done, metrics=metrics, prefilter=prefilter)
+        output_data = build_output(pdf_files, persona, job_to_be_done, relevant_sections)
+
+    if metrics is not None:
+        metrics["total_seconds"] = round(time.perf_counter() - run_start, 6)
+        if isinstance(embeddings, ChunkEmbeddingCache):
+            metrics["embedding_cache"] = {"hits": embeddings.hits, "misses": embeddings.misses}
+        if args.metrics_in_output and output_data is not None:
+            output_data["_metrics"] = metrics
+        if args.metrics:
+            with open(args.metrics, 'a') as f:
+                f.write(json.dumps(dict(metrics, timestamp=datetime.utcnow().isoformat())) + "\n")
+
+    if output_data is not None:
+        output_path = os.path.join(output_dir, 'output.json')
+        with open(output_path, 'w') as f:
+            json.dump(output_data, f, indent=4)
     
+    if isinstance(embeddings, ChunkEmbeddingCache):
+        embeddings.report()
     print(f"\nProcessing complete. Output written to {output_path}")
 
 if __name__ == "__main__":
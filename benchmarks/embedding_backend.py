@@ -0,0 +1,85 @@
+# @title Speed and fidelity of the Challenge 1b embedding backends
+"""
+Embeds the chunks of a corpus with the stock fp32 sentence-transformers
+wrapper, the length-bucketed fp32 backend and the length-bucketed int8
+backend, and reports chunks/sec for each and the cosine agreement of every
+backend's vectors with the fp32 reference.
+
+    python benchmarks/embedding_backend.py --documents 5 --pages 50 --threads 1 4
+    python benchmarks/embedding_backend.py --no-synthetic Challenge_1b/input --model /path/to/model --min-cosine 0.99
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import torch
+
+from run_benchmarks import REPO_ROOT, _load_challenge
+from synthetic_corpus import generate_corpus
+
+def _chunk_texts(search, input_dirs):
+    texts = []
+    for input_dir in input_dirs:
+        texts.extend(chunk['page_content'] for chunk in search._build_chunks(search.process_documents(input_dir)))
+    return texts
+
+def _embed_seconds(embeddings, texts, batch_size):
+    """Embeds `texts` in the batches the streaming pipeline would hand over."""
+    start = time.perf_counter()
+    for i in range(0, len(texts), batch_size):
+        embeddings.embed_documents(texts[i:i + batch_size])
+    return time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the 1b embedding backends.")
+    parser.add_argument('input_dirs', nargs='*', help="directories of PDFs to take chunks from as well")
+    parser.add_argument('--no-synthetic', action='store_true', help="only use the PDFs in input_dirs")
+    parser.add_argument('--documents', type=int, default=3)
+    parser.add_argument('--pages', type=int, default=30)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--model', default=None, help="sentence-transformer name or path (default: the 1b model)")
+    parser.add_argument('--batch-size', type=int, default=64, help="chunks per embed_documents call")
+    parser.add_argument('--threads', type=int, nargs='+', default=[torch.get_num_threads()])
+    parser.add_argument('--min-cosine', type=float, default=None,
+                        help="exit with status 1 if the int8 backend's minimum cosine is below this")
+    args = parser.parse_args()
+
+    search = _load_challenge("1b")
+    if args.model:
+        search.MODEL_NAME = args.model
+    with tempfile.TemporaryDirectory() as corpus_dir:
+        input_dirs = [os.path.join(REPO_ROOT, d) for d in args.input_dirs]
+        if not args.no_synthetic:
+            generate_corpus(corpus_dir, documents=args.documents, pages=args.pages, seed=args.seed)
+            input_dirs.append(corpus_dir)
+        texts = _chunk_texts(search, input_dirs)
+
+    reference = search._get_embeddings()
+    backends = {
+        "fp32": reference,
+        "bucketed fp32": search.BucketedEmbeddings(search.MODEL_NAME, search.MODEL_CACHE, quantize=False),
+        "bucketed int8": search.BucketedEmbeddings(search.MODEL_NAME, search.MODEL_CACHE, quantize=True),
+    }
+    fidelity = {name: search.embedding_fidelity(reference, backend, texts) for name, backend in backends.items()}
+
+    print(f"{len(texts)} chunks, {args.batch_size} per call\n")
+    print(f"{'backend':<16}{'threads':>8}{'chunks/s':>11}{'speedup':>9}{'mean cos':>10}{'min cos':>10}{'p01 cos':>10}")
+    for threads in args.threads:
+        torch.set_num_threads(threads)
+        baseline = None
+        for name, backend in backends.items():
+            seconds = _embed_seconds(backend, texts, args.batch_size)
+            baseline = baseline or seconds
+            f = fidelity[name]
+            print(f"{name:<16}{threads:>8}{len(texts) / seconds:>11.1f}{baseline / seconds:>9.2f}"
+                  f"{f['mean_cosine']:>10.5f}{f['min_cosine']:>10.5f}{f['p01_cosine']:>10.5f}")
+
+    if args.min_cosine is not None and fidelity["bucketed int8"]["min_cosine"] < args.min_cosine:
+        print(f"\nFIDELITY: int8 minimum cosine {fidelity['bucketed int8']['min_cosine']:.5f} "
+              f"is below {args.min_cosine}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+# @title Cold-start time of the Challenge 1a CLI per heading engine
+"""
+Starts a fresh interpreter for every PDF, imports Challenge_1a/main.py and
+runs run_master_engine once, as a short-lived container job would. Reports
+the time to import the module, the time to process the PDF, the wall time of
+the whole process (interpreter start-up included), the engine that handled
+the PDF and whether scikit-learn was loaded. Times are medians over --repeat
+runs.
+
+    python benchmarks/import_time.py
+    python benchmarks/import_time.py Challenge_1a/input Challenge_1b/input --repeat 10
+"""
+import argparse
+import glob
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from run_benchmarks import REPO_ROOT
+
+CHILD = """
+import importlib.util, json, sys, time
+start = time.perf_counter()
+spec = importlib.util.spec_from_file_location("challenge_1a", sys.argv[1])
+engine = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(engine)
+imported = time.perf_counter()
+metrics = {}
+engine.run_master_engine(sys.argv[2], metrics)
+print(json.dumps({"import_seconds": imported - start, "run_seconds": time.perf_counter() - imported,
+                  "engine": metrics.get("engine"), "sklearn": "sklearn" in sys.modules}))
+"""
+
+def cold_start(pdf_path):
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, "-c", CHILD, os.path.join(REPO_ROOT, "Challenge_1a", "main.py"), pdf_path],
+                            capture_output=True, text=True, check=True)
+    record = json.loads(result.stdout.strip().splitlines()[-1])
+    record["process_seconds"] = time.perf_counter() - start
+    return record
+
+def main():
+    parser = argparse.ArgumentParser(description="Cold-start time of the 1a CLI per heading engine.")
+    parser.add_argument('input_dirs', nargs='*', default=["Challenge_1a/input"], help="directories of PDFs")
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    pdf_paths = []
+    for input_dir in args.input_dirs:
+        pdf_paths.extend(sorted(glob.glob(os.path.join(REPO_ROOT, input_dir, '*.pdf'))))
+
+    print(f"{'file':<44}{'engine':>11}{'sklearn':>9}{'import s':>10}{'run s':>9}{'process s':>11}")
+    for path in pdf_paths:
+        runs = [cold_start(path) for _ in range(args.repeat)]
+        median = {key: statistics.median(r[key] for r in runs)
+                  for key in ("import_seconds", "run_seconds", "process_seconds")}
+        print(f"{os.path.basename(path)[:43]:<44}{runs[0]['engine']:>11}{str(runs[0]['sklearn']):>9}"
+              f"{median['import_seconds']:>10.3f}{median['run_seconds']:>9.3f}{median['process_seconds']:>11.3f}")
+
+if __name__ == "__main__":
+    main()
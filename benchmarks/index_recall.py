@@ -0,0 +1,99 @@
+# @title Recall versus latency of the Challenge 1b vector index backends
+"""
+Builds every index backend the persona search supports over the same vectors
+and reports recall@k against exact search, mean per-query latency and the
+serialized index size. Vectors come from a saved knowledge base (--store-dir)
+or, by default, from a synthetic clustered sample of the model's dimension.
+
+    python benchmarks/index_recall.py --vectors 100000 --queries 500
+    python benchmarks/index_recall.py --store-dir /app/output/kb --k 10
+"""
+import argparse
+import itertools
+import os
+import time
+
+import faiss
+import numpy as np
+
+from run_benchmarks import _load_challenge
+
+def synthetic_vectors(n_vectors, dim, clusters=64, seed=0):
+    """Gaussian blobs, so approximate indexes behave as they would on real embeddings."""
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dim)).astype('float32')
+    labels = rng.integers(clusters, size=n_vectors)
+    return centers[labels] + 0.3 * rng.normal(size=(n_vectors, dim)).astype('float32')
+
+def store_vectors(store_dir):
+    index = faiss.read_index(os.path.join(store_dir, 'index.faiss'))
+    return index.reconstruct_n(0, index.ntotal)
+
+def bench_config(search, config, vectors, queries, k):
+    """Builds one backend and returns its recall@k, latency and size."""
+    metric = faiss.METRIC_L2
+    if search._uses_inner_product(config):
+        vectors, queries = vectors.copy(), queries.copy()
+        faiss.normalize_L2(vectors)
+        faiss.normalize_L2(queries)
+        metric = faiss.METRIC_INNER_PRODUCT
+
+    exact = faiss.index_factory(vectors.shape[1], "Flat", metric)
+    exact.add(vectors)
+    _, truth = exact.search(queries, k)
+
+    spec = search._index_factory_string(config, vectors.shape[1], len(vectors))
+    index = faiss.index_factory(vectors.shape[1], spec, metric)
+    start = time.perf_counter()
+    if not index.is_trained:
+        index.train(vectors)
+    index.add(vectors)
+    build_seconds = time.perf_counter() - start
+    search._configure_search(index, config)
+
+    start = time.perf_counter()
+    for query in queries:
+        _, found = index.search(query[None, :], k)
+    latency_ms = (time.perf_counter() - start) / len(queries) * 1000
+    _, found = index.search(queries, k)
+
+    hits = sum(len(set(t) & set(f)) for t, f in zip(truth, found))
+    return {"spec": spec, "metric": config["metric"], "recall": hits / truth.size,
+            "latency_ms": latency_ms, "build_seconds": build_seconds,
+            "size_mb": faiss.serialize_index(index).nbytes / 2**20}
+
+def main():
+    parser = argparse.ArgumentParser(description="Recall and latency of the 1b vector index backends.")
+    parser.add_argument('--store-dir', default=None, help="saved knowledge base to take the vectors from")
+    parser.add_argument('--vectors', type=int, default=50000, help="synthetic vectors when no store is given")
+    parser.add_argument('--dim', type=int, default=384, help="dimension of the synthetic vectors")
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--nprobe', type=int, default=None)
+    parser.add_argument('--ef-search', type=int, default=None)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    search = _load_challenge("1b")
+    if args.store_dir:
+        vectors = store_vectors(args.store_dir)
+    else:
+        vectors = synthetic_vectors(args.vectors, args.dim, seed=args.seed)
+    # Queries are perturbed corpus vectors: close to real chunks, but not identical to any.
+    rng = np.random.default_rng(args.seed + 1)
+    picks = rng.choice(len(vectors), size=min(args.queries, len(vectors)), replace=False)
+    queries = vectors[picks] + 0.05 * rng.normal(size=(len(picks), vectors.shape[1])).astype('float32')
+
+    overrides = {key: value for key, value in (("nprobe", args.nprobe), ("ef_search", args.ef_search))
+                 if value is not None}
+    print(f"{len(vectors)} vectors of dimension {vectors.shape[1]}, {len(queries)} queries, recall@{args.k}\n")
+    print(f"{'index':<22}{'metric':>7}{'recall':>9}{'ms/query':>11}{'build s':>10}{'size MB':>10}")
+    for backend, quantization, metric in itertools.product(("flat", "ivf", "hnsw"), (None, "sq8", "pq"), ("l2", "ip")):
+        config = dict(search.DEFAULT_INDEX_CONFIG, backend=backend, quantization=quantization, metric=metric,
+                      **overrides)
+        result = bench_config(search, config, vectors, queries, args.k)
+        print(f"{result['spec']:<22}{result['metric']:>7}{result['recall']:>9.3f}{result['latency_ms']:>11.3f}"
+              f"{result['build_seconds']:>10.2f}{result['size_mb']:>10.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,190 @@
+# @title Reproducible benchmark suite for the Challenge 1a and 1b engines
+"""
+Times the heading engine (run_master_engine and each of its helpers) and
+the persona search stages on a synthetic corpus, reports pages/sec and peak
+RSS, and appends the results to a JSON history file so regressions surface
+before they reach production.
+
+    python benchmarks/run_benchmarks.py --documents 5 --pages 200
+    python benchmarks/run_benchmarks.py --skip-1b --fail-on-regression
+"""
+import argparse
+import importlib.util
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import fitz  # PyMuPDF
+
+from synthetic_corpus import generate_corpus
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_HISTORY = os.path.join(REPO_ROOT, 'benchmarks', 'history.json')
+QUERY = "Summarize the system design, quality review and test results."
+
+def _load_challenge(name):
+    """Imports Challenge_<name>/main.py under a unique module name (both files are called main.py)."""
+    path = os.path.join(REPO_ROOT, f"Challenge_{name}", "main.py")
+    spec = importlib.util.spec_from_file_location(f"challenge_{name}", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def _peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+class _Timer:
+    """Accumulates wall time per stage and the process's peak RSS once the stage has run."""
+
+    def __init__(self):
+        self.seconds = {}
+        self.peak_rss_mb = {}
+
+    def run(self, stage, fn, *args, **kwargs):
+        start = time.perf_counter()
+        result = fn(*args, **kwargs)
+        self.seconds[stage] = self.seconds.get(stage, 0.0) + time.perf_counter() - start
+        self.peak_rss_mb[stage] = _peak_rss_mb()
+        return result
+
+    def results(self, repeat=1):
+        return {stage: {"seconds": seconds / repeat, "peak_rss_mb": self.peak_rss_mb[stage]}
+                for stage, seconds in self.seconds.items()}
+
+# ==============================================================================
+# STAGE BENCHMARKS
+# ==============================================================================
+
+def bench_challenge_1a(engine, pdf_paths, repeat):
+    """Times every 1a helper and the full run_master_engine over `pdf_paths`."""
+    timer = _Timer()
+    engine._sklearn_clustering()  # time the clustering, not the one-off scikit-learn import
+    for _ in range(repeat):
+        for path in pdf_paths:
+            doc = timer.run("1a.fitz_open", fitz.open, path)
+            layout = timer.run("1a.extract_page_layouts", engine.extract_page_layouts, doc)
+            headers, footers = timer.run("1a.identify_repeating_elements", engine.identify_repeating_elements, layout)
+            blocks = timer.run("1a.get_all_blocks", engine.get_all_blocks, layout, headers, footers)
+            if len(blocks["text"]):
+                timer.run("1a._classify_document_type", engine._classify_document_type, doc, blocks)
+                timer.run("1a._run_visual_engine", engine._run_visual_engine, doc, blocks, headers | footers)
+                timer.run("1a.run_hybrid_engine", engine.run_hybrid_engine, layout, blocks)
+            doc.close()
+            timer.run("1a.run_master_engine", engine.run_master_engine, path)
+    return timer.results(repeat)
+
+def bench_challenge_1b(search, corpus_dir):
+    """Times the three 1b stages once; model loading is excluded from create_knowledge_base."""
+    timer = _Timer()
+    embeddings = search._get_embeddings()
+    docs_data = timer.run("1b.process_documents", search.process_documents, corpus_dir)
+    vector_store = timer.run("1b.create_knowledge_base", search.create_knowledge_base, docs_data, embeddings)
+    timer.run("1b.find_relevant_sections", search.find_relevant_sections, vector_store, QUERY)
+    return timer.results()
+
+# ==============================================================================
+# HISTORY AND REGRESSION CHECK
+# ==============================================================================
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def _load_history(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return []
+
+def find_regressions(previous, current, threshold):
+    """Lists stages whose throughput dropped by more than `threshold` (a fraction)."""
+    regressions = []
+    before = previous["stages"]
+    for stage, result in current["stages"].items():
+        if stage in before and before[stage]["pages_per_sec"]:
+            change = result["pages_per_sec"] / before[stage]["pages_per_sec"] - 1
+            if change < -threshold:
+                regressions.append({"stage": stage, "change": round(change, 3)})
+    return regressions
+
+# ==============================================================================
+# COMMAND-LINE INTERFACE
+# ==============================================================================
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the PDF engines on a synthetic corpus.")
+    parser.add_argument('--documents', type=int, default=5)
+    parser.add_argument('--pages', type=int, default=50)
+    parser.add_argument('--heading-depth', type=int, default=3)
+    parser.add_argument('--toc-pages', type=int, default=1)
+    parser.add_argument('--unnumbered', action='store_true')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=3, help="repetitions of the 1a timings (averaged)")
+    parser.add_argument('--skip-1b', action='store_true', help="skip the embedding stages")
+    parser.add_argument('--model', default=None, help="sentence-transformer name or path for the 1b stages")
+    parser.add_argument('--history', default=DEFAULT_HISTORY)
+    parser.add_argument('--threshold', type=float, default=0.2, help="throughput drop reported as a regression")
+    parser.add_argument('--fail-on-regression', action='store_true')
+    args = parser.parse_args()
+
+    corpus = {"documents": args.documents, "pages": args.pages, "heading_depth": args.heading_depth,
+              "toc_pages": args.toc_pages, "numbered": not args.unnumbered, "seed": args.seed}
+
+    with tempfile.TemporaryDirectory() as corpus_dir:
+        pdf_paths = generate_corpus(corpus_dir, documents=args.documents, pages=args.pages, seed=args.seed,
+                                    heading_depth=args.heading_depth, numbered=not args.unnumbered,
+                                    toc_pages=args.toc_pages)
+        total_pages = sum(fitz.open(p).page_count for p in pdf_paths)
+
+        stages = bench_challenge_1a(_load_challenge("1a"), pdf_paths, args.repeat)
+        if not args.skip_1b:
+            search = _load_challenge("1b")
+            if args.model:
+                search.MODEL_NAME = args.model
+            stages.update(bench_challenge_1b(search, corpus_dir))
+
+    for result in stages.values():
+        result["pages_per_sec"] = round(total_pages / result["seconds"], 2) if result["seconds"] else None
+        result["seconds"] = round(result["seconds"], 5)
+        result["peak_rss_mb"] = round(result["peak_rss_mb"], 1)
+
+    record = {
+        "timestamp": datetime.utcnow().isoformat(),
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "pymupdf": fitz.VersionBind,
+        "corpus": dict(corpus, total_pages=total_pages),
+        "stages": stages,
+    }
+
+    print(f"{'stage':<36}{'seconds':>12}{'pages/sec':>14}{'peak RSS MB':>14}")
+    for stage, result in stages.items():
+        print(f"{stage:<36}{result['seconds']:>12.4f}{result['pages_per_sec'] or 0:>14.1f}{result['peak_rss_mb']:>14.1f}")
+
+    history = _load_history(args.history)
+    previous = next((r for r in reversed(history) if r.get("corpus") == record["corpus"]), None)
+    regressions = find_regressions(previous, record, args.threshold) if previous else []
+    record["regressions"] = regressions
+    history.append(record)
+    os.makedirs(os.path.dirname(os.path.abspath(args.history)), exist_ok=True)
+    with open(args.history, 'w') as f:
+        json.dump(history, f, indent=2)
+    print(f"\nResults appended to {args.history}")
+
+    for regression in regressions:
+        print(f"REGRESSION: {regression['stage']} throughput changed by {regression['change']:+.0%}")
+    if regressions and args.fail_on_regression:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+# @title Synthetic PDF corpus generator for the benchmark suite
+"""
+Generates PDFs with a controlled structure so the engines can be timed on
+documents of any size: page count, heading depth, numbered or styled
+headings, repeating headers/footers and Table of Contents pages.
+"""
+import fitz  # PyMuPDF
+import random
+import argparse
+import os
+
+WORDS = ("analysis system document section process data model result method value table report review "
+         "design quality test product service user market region travel history culture budget schedule "
+         "approach project support network resource policy standard option summary detail feature").split()
+
+def _sentence(rng, n_words):
+    words = [rng.choice(WORDS) for _ in range(n_words)]
+    return " ".join(words).capitalize() + "."
+
+def _paragraph(rng):
+    return " ".join(_sentence(rng, rng.randint(8, 16)) for _ in range(rng.randint(3, 6)))
+
+def _heading_plan(n_headings, depth, rng):
+    """Returns (level, number) pairs, e.g. (2, "3.1"), walking a numbered tree."""
+    counters = [0] * depth
+    plan, level = [], 1
+    for _ in range(n_headings):
+        counters[level - 1] += 1
+        counters[level:] = [0] * (depth - level)
+        plan.append((level, ".".join(str(c) for c in counters[:level])))
+        level = max(1, min(depth, level + rng.choice((-1, 0, 1))))
+    return plan
+
+def generate_pdf(path, pages=20, heading_depth=3, numbered=True, headers_footers=True, toc_pages=1,
+                 headings_per_page=2, seed=0):
+    """Writes one synthetic PDF to `path` and returns its page count."""
+    rng = random.Random(seed)
+    doc = fitz.open()
+    width, height = fitz.paper_size("a4")
+    body_pages = max(1, pages - toc_pages)
+    plan = _heading_plan(body_pages * headings_per_page, heading_depth, rng)
+    sizes = {1: 18, 2: 15, 3: 13, 4: 12}
+
+    def heading_text(level, number):
+        title = " ".join(rng.choice(WORDS).capitalize() for _ in range(rng.randint(2, 5)))
+        return f"{number} {title}" if numbered else title
+
+    titles = [(level, heading_text(level, number)) for level, number in plan]
+
+    def decorate(page):
+        if headers_footers:
+            page.insert_text((50, 30), "Synthetic Benchmark Corpus - Confidential", fontsize=8, fontname="helv")
+            page.insert_text((50, height - 25), "Generated for performance testing", fontsize=8, fontname="helv")
+
+    for toc_index in range(min(toc_pages, pages - 1)):
+        page = doc.new_page(width=width, height=height)
+        decorate(page)
+        page.insert_text((50, 110), "Table of Contents", fontsize=18, fontname="hebo")
+        y = 140
+        for i, (level, title) in enumerate(titles[toc_index * 38:(toc_index + 1) * 38]):
+            page.insert_text((50 + 15 * (level - 1), y), f"{title} {'.' * 20} {toc_pages + 1 + i // headings_per_page}",
+                             fontsize=10, fontname="helv")
+            y += 16
+
+    title_iter = iter(titles)
+    for page_index in range(body_pages):
+        page = doc.new_page(width=width, height=height)
+        decorate(page)
+        y = 110
+        if page_index == 0:
+            page.insert_text((50, y), "Synthetic Benchmark Document", fontsize=24, fontname="hebo")
+            y += 40
+        for _ in range(headings_per_page):
+            level, title = next(title_iter)
+            page.insert_text((50, y), title, fontsize=sizes[min(level, 4)], fontname="hebo")
+            y += 14
+            rect = fitz.Rect(50, y, width - 50, y + 150)
+            page.insert_textbox(rect, _paragraph(rng), fontsize=10, fontname="helv")
+            y += 170
+            if y > height - 220:
+                break
+    doc.set_metadata({"title": "", "producer": "synthetic_corpus"})
+    doc.save(path)
+    page_count = len(doc)
+    doc.close()
+    return page_count
+
+def generate_corpus(output_dir, documents=5, pages=20, seed=0, **kwargs):
+    """Writes `documents` synthetic PDFs to `output_dir` and returns their paths."""
+    os.makedirs(output_dir, exist_ok=True)
+    paths = []
+    for i in range(documents):
+        path = os.path.join(output_dir, f"synthetic_{i:03d}.pdf")
+        generate_pdf(path, pages=pages, seed=seed + i, **kwargs)
+        paths.append(path)
+    return paths
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic PDF corpus.")
+    parser.add_argument('output_dir')
+    parser.add_argument('--documents', type=int, default=5)
+    parser.add_argument('--pages', type=int, default=20)
+    parser.add_argument('--heading-depth', type=int, default=3)
+    parser.add_argument('--unnumbered', action='store_true', help="style-only headings without section numbers")
+    parser.add_argument('--no-headers-footers', action='store_true')
+    parser.add_argument('--toc-pages', type=int, default=1)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    paths = generate_corpus(args.output_dir, documents=args.documents, pages=args.pages, seed=args.seed,
+                            heading_depth=args.heading_depth, numbered=not args.unnumbered,
+                            headers_footers=not args.no_headers_footers, toc_pages=args.toc_pages)
+    print(f"Generated {len(paths)} PDFs in {args.output_dir}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+# @title Instrumentation and service plumbing shared by Challenge 1a and Challenge 1b
+"""
+Stage metrics and the pieces of the warm service modes that both engines use
+unchanged: the JSON request handler base, the Unix-socket HTTP server and the
+listener loop.
+"""
+import json
+import os
+import socketserver
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# ==============================================================================
+# INSTRUMENTATION
+# ==============================================================================
+# Stage metrics are opt-in: callers pass a dict as `metrics` and each stage
+# appends its wall time and counters to it. With metrics=None the cost is one
+# perf_counter() call and a None check per stage.
+
+def record_stage(metrics, stage, start, **counters):
+    """Appends a stage record to `metrics` (if enabled) and returns the start time of the next stage."""
+    now = time.perf_counter()
+    if metrics is not None:
+        metrics.setdefault("stages", []).append(dict(stage=stage, seconds=round(now - start, 6), **counters))
+    return now
+
+# ==============================================================================
+# SERVICE PLUMBING
+# ==============================================================================
+
+class JSONRequestHandler(BaseHTTPRequestHandler):
+    """Request handler base that answers with JSON bodies and keeps the access log quiet."""
+
+    def _reply(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+class ThreadingUnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+def run_server(handler, host, port, socket_path, name):
+    """Serves `handler` on a localhost port or, with `socket_path`, a Unix socket until interrupted."""
+    if socket_path:
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        server = ThreadingUnixHTTPServer(socket_path, handler)
+        print(f"{name} listening on unix:{socket_path}")
+    else:
+        server = ThreadingHTTPServer((host, port), handler)
+        print(f"{name} listening on http://{host}:{port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
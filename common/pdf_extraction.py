@@ -0,0 +1,224 @@
+# @title Shared PDF extraction for Challenge 1a and Challenge 1b
+"""
+One `get_text("dict")` parse per page yields everything both challenges need:
+the text blocks and their styles, the font-size histogram behind the body
+baseline, the header/footer strings, the Table of Contents texts and, on
+request, the page's plain text with the position of every block in it. The
+rule-based heading pass used by the 1a hybrid engine and by 1b ingestion lives
+here too.
+"""
+import fitz  # PyMuPDF
+import numpy as np
+import re
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+# ==============================================================================
+# PAGE LAYOUTS
+# ==============================================================================
+
+def _parse_page(page, sizes, with_text=False):
+    """
+    Parses one page into its text blocks, TOC texts and header/footer text, and
+    counts its span font sizes into `sizes`. With `with_text` it adds the plain
+    text (lines of each text block, newline-terminated) and the offset and y0 of
+    every text block within it.
+    """
+    height = page.rect.height
+    header_lines, footer_lines, toc_texts, text_blocks = [], [], [], []
+    text_parts, offsets, y_positions, length = [], [], [], 0
+    for block in page.get_text("dict").get("blocks", []):
+        if "lines" not in block:
+            toc_texts.append("")
+            continue
+        line_texts = []
+        for line in block.get("lines", []):
+            spans = line.get("spans", [])
+            line_text = "".join(s["text"] for s in spans)
+            line_texts.append(line_text)
+            for span in spans:
+                sizes[round(span["size"])] += len(span["text"])
+            mid_y = (line["bbox"][1] + line["bbox"][3]) / 2
+            if mid_y <= height * 0.1:
+                header_lines.append((line["bbox"][3], line["bbox"][0], line_text))
+            elif mid_y >= height * 0.9:
+                footer_lines.append((line["bbox"][3], line["bbox"][0], line_text))
+        toc_texts.append("\n".join(line_texts))
+        if with_text and line_texts:
+            offsets.append(length)
+            y_positions.append(block['bbox'][1])
+            text_parts.append(toc_texts[-1] + "\n")
+            length += len(text_parts[-1])
+        block_text = " ".join(s["text"].strip() for l in block["lines"] for s in l.get("spans", [])).strip()
+        if not block_text or block_text.isdigit():
+            continue
+        if block["lines"] and "spans" in block["lines"][0] and block["lines"][0]["spans"]:
+            first_span = block["lines"][0]["spans"][0]
+            font = first_span["font"].lower()
+            text_blocks.append((block_text, first_span["size"], "bold" in font or "black" in font,
+                                block['bbox'][0], block['bbox'][1]))
+    page_layout = {
+        "header": "\n".join(t for _, _, t in sorted(header_lines)).strip(),
+        "footer": "\n".join(t for _, _, t in sorted(footer_lines)).strip(),
+        "toc_texts": toc_texts, "blocks": text_blocks
+    }
+    if with_text:
+        page_layout.update(text="".join(text_parts), text_offsets=offsets, text_y0=y_positions)
+    return page_layout
+
+def _new_layout(page_count, first_page_height):
+    return {"page_count": page_count, "first_page_height": first_page_height, "sizes": Counter(), "pages": []}
+
+def extract_page_layouts(doc, with_text=False):
+    """Parses every page once and keeps only what the helpers below need."""
+    layout = _new_layout(doc.page_count if doc is not None and not doc.is_closed else 0, 0)
+    if not layout["page_count"]: return layout
+    layout["first_page_height"] = doc[0].rect.height
+    layout["pages"] = [_parse_page(page, layout["sizes"], with_text) for page in doc]
+    return layout
+
+# ==============================================================================
+# INTRA-DOCUMENT PAGE SHARDING
+# ==============================================================================
+# A single large PDF can be parsed by several processes, each opening its own
+# fitz handle on a contiguous page range. Shards return their page layouts and
+# font-size Counter; merged in page order they give the same layout as
+# extract_page_layouts.
+SHARD_MIN_PAGES = 50
+
+def _layout_shard(pdf_path, first, last, with_text):
+    """Parses pages [first, last) of `pdf_path` and counts their font sizes."""
+    with fitz.open(pdf_path) as doc:
+        sizes = Counter()
+        return [_parse_page(doc[index], sizes, with_text) for index in range(first, last)], sizes
+
+def extract_page_layouts_sharded(doc, pdf_path, shards, with_text=False):
+    """extract_page_layouts with the pages parsed by `shards` worker processes."""
+    layout = _new_layout(doc.page_count, doc[0].rect.height)
+    bounds = np.linspace(0, doc.page_count, shards + 1).astype(int)
+    with ProcessPoolExecutor(max_workers=shards) as pool:
+        for pages, sizes in pool.map(_layout_shard, [pdf_path] * shards, bounds[:-1], bounds[1:],
+                                     [with_text] * shards):
+            layout["pages"].extend(pages)
+            layout["sizes"].update(sizes)
+    return layout
+
+# ==============================================================================
+# DOCUMENT STATISTICS AND BLOCKS
+# ==============================================================================
+
+def get_document_baseline(layout):
+    """Calculates the most common font size for the document's body text."""
+    sizes = layout["sizes"]
+    return sizes.most_common(1)[0][0] if sizes else 10
+
+def identify_repeating_elements(layout):
+    """Identifies headers/footers by finding text that repeats across pages."""
+    if layout["page_count"] < 3:
+        return set(), set()
+    repeating_texts = Counter()
+    for page in layout["pages"]:
+        for key in ("header", "footer"):
+            text = page[key]
+            if text and len(text.split()) < 15 and not text.isdigit():
+                repeating_texts[(text, key)] += 1
+    min_occurrence = max(2, layout["page_count"] // 3)
+    headers = {text for (text, key), count in repeating_texts.items() if key == 'header' and count >= min_occurrence}
+    footers = {text for (text, key), count in repeating_texts.items() if key == 'footer' and count >= min_occurrence}
+    return headers, footers
+
+def is_toc_page(page_layout):
+    """Heuristic to detect if a page is a Table of Contents."""
+    blocks = page_layout["toc_texts"]
+    if not blocks: return False
+    toc_keywords = ["table of contents", "contents"]
+    for b in blocks[:5]:
+        if any(keyword in b.lower() for keyword in toc_keywords):
+            return True
+    dot_leader_count = sum(1 for b in blocks if "..." in b and b.strip().endswith(tuple(map(str, range(10)))))
+    if len(blocks) > 5 and dot_leader_count / len(blocks) > 0.3:
+        return True
+    return False
+
+def get_all_blocks(layout, headers=frozenset(), footers=frozenset(), skip_toc_pages=True):
+    """
+    Collects all non-TOC, non-header/footer text blocks into a columnar store:
+    a dict of equal-length NumPy arrays keyed by text, page, size, bold, x0, y0.
+    """
+    full_filter_list = headers.union(footers)
+    rows = []
+    for page_num, page in enumerate(layout["pages"], 1):
+        if skip_toc_pages and is_toc_page(page):
+            continue
+        rows.extend((page_num,) + block for block in page["blocks"] if block[0] not in full_filter_list)
+    pages, texts, sizes, bolds, x0s, y0s = zip(*rows) if rows else ((),) * 6
+    text = np.empty(len(texts), dtype=object)
+    text[:] = texts
+    return {
+        "text": text, "page": np.array(pages, dtype=np.int32), "size": np.array(sizes, dtype=np.float64),
+        "bold": np.array(bolds, dtype=bool), "x0": np.array(x0s, dtype=np.float64),
+        "y0": np.array(y0s, dtype=np.float64)
+    }
+
+def select_blocks(blocks, mask):
+    """Applies a boolean mask or index array to every column of a block store."""
+    return {key: column[mask] for key, column in blocks.items()}
+
+def word_counts(texts):
+    return np.fromiter((len(t.split()) for t in texts), dtype=np.int32, count=len(texts))
+
+def text_mask(texts, pattern):
+    """Vectorized `re.search` over a text column."""
+    search = pattern.search
+    return np.fromiter((search(t) is not None for t in texts), dtype=bool, count=len(texts))
+
+# ==============================================================================
+# RULE-BASED HEADINGS
+# ==============================================================================
+
+NUMBERED_PATTERN = re.compile(r"^\s*(?:(Appendix\s[A-Z])|(\d+(?:\.\d+)*)|([A-Z]))\s*[.:-]?\s*")
+
+def run_hybrid_engine(layout, all_blocks, with_positions=False):
+    """
+    A highly adaptive engine for business docs, forms, and flyers. With
+    `with_positions` every heading also carries the y0 of its block.
+    """
+    baseline_size = get_document_baseline(layout)
+    texts, sizes, bolds = all_blocks["text"], all_blocks["size"], all_blocks["bold"]
+    counts = word_counts(texts)
+    next_word_counts = np.append(counts[1:], 0)
+    is_last = np.arange(len(texts)) == len(texts) - 1
+    matches = [NUMBERED_PATTERN.match(t) for t in texts]
+    is_numbered = np.fromiter((m is not None for m in matches), dtype=bool, count=len(texts))
+
+    # Numbered blocks are kept unless they are short, plain and body-sized;
+    # bold, enlarged blocks need either enough words or a long block after them.
+    keep_numbered = is_numbered & (bolds | ~((counts < 5) & (sizes < baseline_size * 1.1)))
+    keep_styled = (~is_numbered & bolds & (sizes > baseline_size * 1.15)
+                   & ~((counts < 5) & (is_last | (next_word_counts < 15))))
+
+    outline = []
+    for i in np.flatnonzero(keep_numbered | keep_styled):
+        text = texts[i]
+        if keep_numbered[i]:
+            match = matches[i]
+            groups, clean_text = match.groups(), text[match.end():].strip()
+            num_str = next(g for g in groups if g is not None)
+            level = "H1" if "Appendix" in num_str else f"H{min(num_str.count('.') + 1, 4)}"
+        else:
+            clean_text = text
+            level = "H2" if sizes[i] > baseline_size * 1.4 else "H3"
+        if clean_text:
+            outline.append((i, level, clean_text))
+
+    final_outline = []
+    seen = set()
+    page, y0 = all_blocks["page"], all_blocks["y0"]
+    for i, level, text in sorted(outline, key=lambda h: (page[h[0]], y0[h[0]])):
+        if (text, level) not in seen:
+            heading = {'level': level, 'text': text, 'page': int(page[i])}
+            if with_positions:
+                heading['y0'] = float(y0[i])
+            final_outline.append(heading)
+            seen.add((text, level))
+    return final_outline
@@ -0,0 +1,14 @@
+import importlib.util
+import os
+
+import pytest
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+@pytest.fixture(scope="session")
+def search():
+    """Challenge_1b/main.py, imported as a module."""
+    spec = importlib.util.spec_from_file_location("challenge_1b", os.path.join(REPO_ROOT, "Challenge_1b", "main.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
@@ -0,0 +1,29 @@
+"""Failure reporting of the Challenge 1a batch mode."""
+import importlib.util
+import os
+import shutil
+
+import pytest
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+@pytest.fixture(scope="module")
+def engine():
+    spec = importlib.util.spec_from_file_location("challenge_1a", os.path.join(REPO_ROOT, "Challenge_1a", "main.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def test_unreadable_pdf_is_reported_as_a_failure(engine, tmp_path):
+    input_dir, output_dir = tmp_path / "input", tmp_path / "output"
+    input_dir.mkdir()
+    output_dir.mkdir()
+    shutil.copy(os.path.join(REPO_ROOT, "Challenge_1a", "input", "file01.pdf"), input_dir / "good.pdf")
+    (input_dir / "bad.pdf").write_text("not a pdf")
+
+    error, _ = engine.process_file(str(input_dir / "bad.pdf"), str(output_dir / "bad.json"))
+    assert error
+
+    failures = engine.run_batch(["bad.pdf", "good.pdf"], str(input_dir), str(output_dir), workers=2)
+    assert [f["file"] for f in failures] == ["bad.pdf"]
+    assert (output_dir / "good.json").exists()
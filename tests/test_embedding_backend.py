@@ -0,0 +1,64 @@
+"""The length-bucketed embedding backend of Challenge 1b, on a tiny locally built model."""
+import numpy as np
+import pytest
+
+TEXTS = [
+    "Nice is known for its pebble beaches and the Promenade des Anglais.",
+    "Bouillabaisse",
+    "The old town of Avignon was the seat of the popes in the fourteenth century, and its palace still "
+    "dominates the skyline above the Rhone. " * 3,
+    "Pack light layers for cool evenings on the coast.",
+    "Wine tasting in Provence",
+    "Marseille, the oldest city in France, was founded by Greek settlers around 600 BC.",
+] * 4
+
+@pytest.fixture(scope="module")
+def stand_in_model(tmp_path_factory):
+    """A 2-layer, 64-dim BERT sentence-transformer with a WordPiece vocabulary trained on TEXTS."""
+    from sentence_transformers import SentenceTransformer, models
+    from tokenizers import Tokenizer, normalizers, pre_tokenizers, processors
+    from tokenizers.models import WordPiece
+    from tokenizers.trainers import WordPieceTrainer
+    from transformers import BertConfig, BertModel, BertTokenizerFast
+
+    path = str(tmp_path_factory.mktemp("stand_in_model"))
+    tokenizer = Tokenizer(WordPiece(unk_token="[UNK]"))
+    tokenizer.normalizer = normalizers.BertNormalizer(lowercase=True)
+    tokenizer.pre_tokenizer = pre_tokenizers.BertPreTokenizer()
+    tokenizer.train_from_iterator(TEXTS, WordPieceTrainer(vocab_size=500, special_tokens=[
+        "[PAD]", "[UNK]", "[CLS]", "[SEP]", "[MASK]"]))
+    tokenizer.post_processor = processors.TemplateProcessing(
+        single="[CLS] $A [SEP]", special_tokens=[("[CLS]", tokenizer.token_to_id("[CLS]")),
+                                                 ("[SEP]", tokenizer.token_to_id("[SEP]"))])
+    BertTokenizerFast(tokenizer_object=tokenizer, model_max_length=128).save_pretrained(path)
+    config = BertConfig(vocab_size=tokenizer.get_vocab_size(), hidden_size=64, num_hidden_layers=2,
+                        num_attention_heads=4, intermediate_size=128, max_position_embeddings=128)
+    BertModel(config).save_pretrained(path)
+
+    transformer = models.Transformer(path, max_seq_length=128)
+    SentenceTransformer(modules=[transformer, models.Pooling(64)]).save(path)
+    return path
+
+def test_buckets_stay_within_the_token_budget(search, stand_in_model):
+    embeddings = search.BucketedEmbeddings(stand_in_model, quantize=False, max_batch_tokens=64, max_batch_size=8)
+    lengths = [len(ids) for ids in embeddings.tokenizer(TEXTS)['input_ids']]
+    batches = list(embeddings._buckets(lengths))
+    assert sorted(i for batch in batches for i in batch) == list(range(len(TEXTS)))
+    for batch in batches:
+        assert len(batch) <= 8
+        assert len(batch) == 1 or len(batch) * max(lengths[i] for i in batch) <= 64
+
+def test_rows_come_back_in_input_order(search, stand_in_model):
+    embeddings = search.BucketedEmbeddings(stand_in_model, quantize=False, max_batch_tokens=64)
+    vectors = embeddings.embed_documents(TEXTS)
+    for text, vector in zip(TEXTS[:6], vectors[:6]):
+        np.testing.assert_allclose(embeddings.embed_query(text), vector, atol=1e-5)
+
+@pytest.mark.parametrize("quantize, min_cosine", [(False, 0.99999), (True, 0.99)])
+def test_fidelity_against_the_fp32_wrapper(search, stand_in_model, monkeypatch, quantize, min_cosine):
+    monkeypatch.setattr(search, "MODEL_NAME", stand_in_model)
+    reference = search._get_embeddings()
+    fidelity = search.embedding_fidelity(reference, search.BucketedEmbeddings(stand_in_model, quantize=quantize),
+                                         TEXTS)
+    assert fidelity["texts"] == len(TEXTS)
+    assert fidelity["min_cosine"] > min_cosine
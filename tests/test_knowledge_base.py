@@ -0,0 +1,96 @@
+"""Incremental updates of the persisted Challenge 1b knowledge base."""
+import os
+import shutil
+import time
+
+import pytest
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SAMPLE_DIR = os.path.join(REPO_ROOT, "Challenge_1b", "input")
+SAMPLES = ["South of France - Cities.pdf", "South of France - Cuisine.pdf", "South of France - History.pdf"]
+
+@pytest.fixture
+def embeddings():
+    # Same text, same vector: a chunk's own text must find that chunk first.
+    return DeterministicFakeEmbedding(size=32)
+
+def _copy_samples(input_dir, names):
+    os.makedirs(input_dir, exist_ok=True)
+    for name in names:
+        shutil.copy(os.path.join(SAMPLE_DIR, name), os.path.join(input_dir, name))
+
+def _assert_consistent(search, vector_store, removed):
+    assert vector_store.index.ntotal == len(vector_store.index_to_docstore_id)
+    docs = [vector_store.docstore.search(doc_id) for doc_id in vector_store.index_to_docstore_id.values()]
+    assert all(doc.metadata["source"] != removed for doc in docs)
+    for doc in docs[::25]:
+        top = search.find_relevant_sections(vector_store, doc.page_content, top_k=5)
+        assert top[0]["refined_text"] == doc.page_content
+
+@pytest.mark.parametrize("backend", ["ivf", "hnsw"])
+def test_removing_a_pdf_keeps_the_index_and_docstore_in_step(search, embeddings, tmp_path, backend):
+    input_dir, store_dir = str(tmp_path / "input"), str(tmp_path / "kb")
+    index_config = dict(search.DEFAULT_INDEX_CONFIG, backend=backend)
+    _copy_samples(input_dir, SAMPLES)
+    search.load_or_update_knowledge_base(input_dir, store_dir, embeddings, index_config=index_config)
+
+    os.remove(os.path.join(input_dir, SAMPLES[0]))
+    metrics = {}
+    vector_store = search.load_or_update_knowledge_base(input_dir, store_dir, embeddings, metrics=metrics,
+                                                        index_config=index_config)
+    assert metrics["stages"][0]["to_embed"] == 0  # rebuilt from stored vectors, nothing re-embedded
+    _assert_consistent(search, vector_store, SAMPLES[0])
+
+    # Vectors added after the removal get fresh positions, and the saved store reloads intact.
+    _copy_samples(input_dir, SAMPLES[:1])
+    search.load_or_update_knowledge_base(input_dir, store_dir, embeddings, index_config=index_config)
+    os.remove(os.path.join(input_dir, SAMPLES[1]))
+    search.load_or_update_knowledge_base(input_dir, store_dir, embeddings, index_config=index_config)
+    vector_store = search.load_or_update_knowledge_base(input_dir, store_dir, embeddings, index_config=index_config)
+    _assert_consistent(search, vector_store, SAMPLES[1])
+
+def test_identical_pdfs_under_different_names(search, embeddings, tmp_path):
+    input_dir, store_dir = str(tmp_path / "input"), str(tmp_path / "kb")
+    _copy_samples(input_dir, SAMPLES[:1])
+    shutil.copy(os.path.join(input_dir, SAMPLES[0]), os.path.join(input_dir, "Cities copy.pdf"))
+    vector_store = search.load_or_update_knowledge_base(input_dir, store_dir, embeddings)
+    sources = [vector_store.docstore.search(i).metadata["source"] for i in vector_store.index_to_docstore_id.values()]
+    assert sources.count("Cities copy.pdf") == sources.count(SAMPLES[0]) > 0
+
+    # Incremental run: a second copy is added next to the stored ones.
+    shutil.copy(os.path.join(input_dir, SAMPLES[0]), os.path.join(input_dir, "Cities copy 2.pdf"))
+    vector_store = search.load_or_update_knowledge_base(input_dir, store_dir, embeddings)
+    assert vector_store.index.ntotal == 3 * sources.count(SAMPLES[0])
+
+def test_query_time_settings_do_not_invalidate_the_store(search, embeddings, tmp_path):
+    input_dir, store_dir = str(tmp_path / "input"), str(tmp_path / "kb")
+    _copy_samples(input_dir, SAMPLES[:1])
+    index_config = dict(search.DEFAULT_INDEX_CONFIG, backend="ivf", nprobe=16)
+    search.load_or_update_knowledge_base(input_dir, store_dir, embeddings, index_config=index_config)
+
+    metrics = {}
+    vector_store = search.load_or_update_knowledge_base(input_dir, store_dir, embeddings, metrics=metrics,
+                                                        index_config=dict(index_config, nprobe=32))
+    assert "to_embed" not in metrics["stages"][0]  # loaded as is
+    assert search.faiss.extract_index_ivf(vector_store.index).nprobe == 32
+
+def test_background_producer_stops_when_the_consumer_fails(search):
+    # The producer has finished and filled the queue before the consumer raises.
+    chunks = search._iter_in_background(iter(range(5)), 4)
+    assert next(chunks) == 0
+    time.sleep(0.5)
+    with pytest.raises(ValueError):
+        chunks.throw(ValueError("embedding failed"))
+
+def test_updating_a_store_leaves_a_mapped_copy_readable(search, embeddings, tmp_path):
+    input_dir, store_dir = str(tmp_path / "input"), str(tmp_path / "kb")
+    _copy_samples(input_dir, SAMPLES)
+    search.load_or_update_knowledge_base(input_dir, store_dir, embeddings)
+    mapped = search.load_or_update_knowledge_base(input_dir, store_dir, embeddings)  # up to date: memory-mapped
+
+    # A CLI run or /reload rewrites the store while the mapped copy still answers queries.
+    os.remove(os.path.join(input_dir, SAMPLES[0]))
+    search.load_or_update_knowledge_base(input_dir, store_dir, embeddings)
+    assert search.find_relevant_sections(mapped, "local wines", top_k=5)
+    assert sorted(os.listdir(store_dir)) == ["index.faiss", "index.pkl", "manifest.json"]